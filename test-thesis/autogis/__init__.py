@@ -1,3 +1,14 @@
 from .graph import *
 from .utils import *
-from .route import *
\ No newline at end of file
+from .route import *
+from .routing import *
+from .csr import *
+from .centrality import *
+from .cache import *
+from .store import *
+from .pipeline import *
+from .spatial import *
+from .geocode import *
+from .download import *
+from .footprint import *
+from .render import *
\ No newline at end of file
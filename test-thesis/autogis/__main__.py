@@ -0,0 +1,15 @@
+import sys
+
+from .pipeline import main as indicators, download_main as download, \
+        render_main as render
+
+# python -m autogis <command> [args]
+commands = {
+    'indicators': indicators,
+    'download': download,
+    'render': render,
+}
+
+if len(sys.argv) < 2 or sys.argv[1] not in commands:
+    sys.exit(f"usage: python -m autogis {{{','.join(commands)}}} [-h] ...")
+commands[sys.argv[1]](sys.argv[2:])
@@ -0,0 +1,188 @@
+import glob
+import hashlib
+import json
+import os
+import pickle
+import tempfile
+from typing import Any, Callable, Optional
+
+import networkx as nx
+
+
+def file_hash(path: str) -> str:
+    """sha1 hash of the contents of a file"""
+    h = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def graph_hash(G: nx.MultiDiGraph | str) -> str:
+    """hash of a street network graph
+
+    a path hashes the contents of the file, a graph hashes its crs,
+    node coordinates and edge lengths
+
+    Args:
+        G (nx.MultiDiGraph | str): graph or path to graphml file
+    """
+    if isinstance(G, str):
+        return file_hash(G)
+    h = hashlib.sha1(str(G.graph.get('crs')).encode())
+    for node, d in G.nodes(data=True):
+        h.update(repr((node, d.get('x'), d.get('y'))).encode())
+    for u, v, k, d in G.edges(keys=True, data=True):
+        h.update(repr((u, v, k, d.get('length'))).encode())
+    return h.hexdigest()
+
+
+def params_hash(params: dict) -> str:
+    """hash of algorithm parameters"""
+    text = json.dumps(params, sort_keys=True, default=str)
+    return hashlib.sha1(text.encode()).hexdigest()[:16]
+
+
+class ResultCache:
+    """disk backed store of centrality and indicator results
+
+    results are pickled to `directory` in files named after the hash of
+    the graph, the algorithm and the hash of its parameters. Reading a
+    result marks it as recently used, the least recently used results
+    are evicted when the store grows over `max_bytes`.
+    """
+
+    def __init__(self, directory: str='cache/results', max_bytes: int=1 << 30):
+        """
+        Args:
+            directory (str, optional): directory to store results in
+            max_bytes (int, optional): maximum total size of the results
+        """
+        self.directory = directory
+        self.max_bytes = max_bytes
+
+    def path(self, ghash: str, name: str, params: dict) -> str:
+        """get file path of a result"""
+        return os.path.join(self.directory,
+                f"{ghash}-{name}-{params_hash(params)}.pkl")
+
+    def get(self, ghash: str, name: str, params: dict, default=None) -> Any:
+        """get stored result or default if there is none
+
+        Args:
+            ghash (str): hash of the graph, see `graph_hash`
+            name (str): name of the algorithm
+            params (dict): parameters of the algorithm
+        """
+        path = self.path(ghash, name, params)
+        try:
+            with open(path, 'rb') as f:
+                result = pickle.load(f)
+        except (FileNotFoundError, EOFError, pickle.UnpicklingError):
+            return default
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            # evicted by another process sharing the store
+            pass
+        return result
+
+    def put(self, ghash: str, name: str, params: dict, result: Any):
+        """store a result, evicting old results if the store is too big
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        with os.fdopen(fd, 'wb') as f:
+            pickle.dump(result, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, self.path(ghash, name, params))
+        self.evict()
+
+    def fetch(self, G: nx.MultiDiGraph | str, name: str, params: dict,
+            compute: Callable[[], Any]) -> Any:
+        """get stored result or compute and store it
+
+        Args:
+            G (nx.MultiDiGraph | str): graph or path to graphml file
+            name (str): name of the algorithm
+            params (dict): parameters of the algorithm
+            compute (Callable): function computing the result
+        """
+        ghash = graph_hash(G)
+        missing = object()
+        result = self.get(ghash, name, params, missing)
+        if result is missing:
+            result = compute()
+            self.put(ghash, name, params, result)
+        return result
+
+    def _stats(self) -> list[tuple[str, os.stat_result]]:
+        """paths and stats of stored results, least recently used first
+
+        results removed by other processes sharing the store while it is
+        listed are left out
+        """
+        stats = []
+        for f in glob.glob(os.path.join(self.directory, '*.pkl')):
+            try:
+                stats.append((f, os.stat(f)))
+            except FileNotFoundError:
+                continue
+        return sorted(stats, key=lambda e: e[1].st_mtime)
+
+    def entries(self) -> list[str]:
+        """paths of stored results, least recently used first"""
+        return [f for f, _ in self._stats()]
+
+    def size(self) -> int:
+        """total size of the stored results in bytes"""
+        return sum(st.st_size for _, st in self._stats())
+
+    def evict(self):
+        """remove least recently used results until the store is under
+        `max_bytes`
+        """
+        stats = self._stats()
+        total = sum(st.st_size for _, st in stats)
+        for f, st in stats:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(f)
+            except FileNotFoundError:
+                pass
+            total -= st.st_size
+
+    def invalidate(self, G: Optional[nx.MultiDiGraph | str]=None,
+            name: Optional[str]=None):
+        """remove stored results
+
+        Args:
+            G (nx.MultiDiGraph | str, optional): only remove results of
+                this graph or graphml file
+            name (str, optional): only remove results of this algorithm
+        """
+        ghash = '*' if G is None else graph_hash(G)
+        pattern = f"{ghash}-{name or '*'}-*.pkl"
+        for f in glob.glob(os.path.join(self.directory, pattern)):
+            try:
+                os.remove(f)
+            except FileNotFoundError:
+                pass
+
+
+# store used when functions are called with cache=True
+result_cache = ResultCache()
+
+
+def cached(G: nx.MultiDiGraph | str, name: str, params: dict,
+        compute: Callable[[], Any], cache: bool | ResultCache=True) -> Any:
+    """compute a result through the result cache
+
+    Args:
+        cache (bool | ResultCache): store to use, `result_cache` if True,
+            compute without caching if False
+    """
+    if cache is False:
+        return compute()
+    store = result_cache if cache is True else cache
+    return store.fetch(G, name, params, compute)
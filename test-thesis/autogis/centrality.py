@@ -0,0 +1,309 @@
+import math
+import random
+from concurrent.futures import ProcessPoolExecutor
+from heapq import heappush, heappop
+from itertools import count
+from typing import Any, Hashable, Optional
+
+import networkx as nx
+
+from .routing import edge_weight, dijkstra
+
+# graph shared by the centrality worker processes, set by `_init_worker`
+_worker_graph: Optional[nx.MultiDiGraph] = None
+
+
+def shortest_path_dag(G: nx.MultiDiGraph, source: Hashable,
+        weight: Optional[str]='length') -> tuple[list, dict, dict]:
+    """single source shortest paths counting, as needed by brandes' algorithm
+
+    parallel edges are collapsed to the cheapest one, the same as
+    running on `ox.get_digraph(G)`
+
+    Returns:
+        tuple[list, dict, dict]: nodes in order of distance, predecessors
+            and number of shortest paths of each node
+    """
+    S, P, sigma, dist = [], {source: []}, {source: 1.0}, {}
+    seen = {source: 0}
+    c = count()
+    heap = [(0, next(c), source, source)]
+    while heap:
+        d, _, pred, v = heappop(heap)
+        if v in dist:
+            continue
+        sigma[v] += sigma[pred] if pred != v else 0
+        S.append(v)
+        dist[v] = d
+        for w, keydict in G.adj[v].items():
+            vw_dist = d + edge_weight(keydict, weight)
+            if w not in dist and (w not in seen or vw_dist < seen[w]):
+                seen[w] = vw_dist
+                heappush(heap, (vw_dist, next(c), v, w))
+                sigma[w] = 0.0
+                P[w] = [v]
+            elif vw_dist == seen[w]:
+                sigma[w] += sigma[v]
+                P[w].append(v)
+    return S, P, sigma
+
+
+def source_dependencies(G: nx.MultiDiGraph, source: Hashable,
+        weight: Optional[str]='length', edges: bool=False) -> dict:
+    """dependency of the source on every other node (or edge), i.e. the
+    contribution of one source to the betweenness centrality
+    """
+    S, P, sigma = shortest_path_dag(G, source, weight)
+    delta = dict.fromkeys(S, 0.0)
+    dep = {}
+    for w in reversed(S):
+        coeff = (1 + delta[w]) / sigma[w]
+        for v in P[w]:
+            c = sigma[v] * coeff
+            if edges:
+                dep[(v, w)] = c
+            delta[v] += c
+        if not edges and w != source:
+            dep[w] = delta[w]
+    return dep
+
+
+def _accumulate(G: nx.MultiDiGraph, sources: list[Any], weight: Optional[str],
+        edges: bool) -> tuple[dict, dict]:
+    total, squares = {}, {}
+    for s in sources:
+        for key, c in source_dependencies(G, s, weight, edges).items():
+            total[key] = total.get(key, 0.0) + c
+            squares[key] = squares.get(key, 0.0) + c * c
+    return total, squares
+
+
+def _init_worker(G: nx.MultiDiGraph):
+    global _worker_graph
+    _worker_graph = G
+
+
+def _worker_accumulate(job: tuple[list[Any], Optional[str], bool]) \
+        -> tuple[dict, dict]:
+    sources, weight, edges = job
+    return _accumulate(_worker_graph, sources, weight, edges)
+
+
+def _worker_tail_sums(job: tuple[list[Any], Optional[str], dict, dict]) \
+        -> list[tuple]:
+    tails, weight, in_count, in_half = job
+    return [tail_sums(_worker_graph, u, weight, in_count, in_half)
+            for u in tails]
+
+
+def accumulate_dependencies(G: nx.MultiDiGraph, sources: list[Any],
+        weight: Optional[str]='length', edges: bool=False, workers: int=1) \
+        -> tuple[dict, dict]:
+    """sum up the dependencies of a set of sources
+
+    the sources are split into one chunk per worker process and the
+    partial sums of the workers are merged
+
+    Returns:
+        tuple[dict, dict]: sum and sum of squares of the dependencies
+    """
+    if workers <= 1 or len(sources) < 2:
+        return _accumulate(G, sources, weight, edges)
+
+    chunks = [sources[i::workers] for i in range(workers)]
+    jobs = [(chunk, weight, edges) for chunk in chunks if chunk]
+    total, squares = {}, {}
+    with ProcessPoolExecutor(max_workers=len(jobs), initializer=_init_worker,
+            initargs=(G,)) as pool:
+        for t, sq in pool.map(_worker_accumulate, jobs):
+            for key, c in t.items():
+                total[key] = total.get(key, 0.0) + c
+            for key, c in sq.items():
+                squares[key] = squares.get(key, 0.0) + c
+    return total, squares
+
+
+def _scale(n: int, edges: bool, normalized: bool) -> float:
+    if not normalized:
+        return 1.0
+    if edges:
+        return 1 / (n * (n - 1)) if n > 1 else 1.0
+    return 1 / ((n - 1) * (n - 2)) if n > 2 else 1.0
+
+
+def _edge_keys(G: nx.MultiDiGraph, bc: dict, weight: Optional[str]) -> dict:
+    """spread the centrality of each (u, v) pair over its parallel edges
+    the way networkx does for multigraphs
+    """
+    edge_bc = {}
+    for u, v, k in G.edges(keys=True):
+        keydict = G.adj[u][v]
+        if weight is None:
+            share = len(keydict)
+        else:
+            w = edge_weight(keydict, weight)
+            if keydict[k].get(weight, 1) != w:
+                edge_bc[(u, v, k)] = 0.0
+                continue
+            share = sum(1 for d in keydict.values() if d.get(weight, 1) == w)
+        edge_bc[(u, v, k)] = bc.get((u, v), 0.0) / share
+    return edge_bc
+
+
+def sampled_betweenness(G: nx.MultiDiGraph, k: Optional[int]=None,
+        seed: Optional[int]=None, weight: Optional[str]='length',
+        edges: bool=False, normalized: bool=True, workers: int=1) \
+        -> tuple[dict, dict]:
+    """estimate betweenness centrality from a random sample of k sources
+
+    the estimate scales the sampled dependencies by n/k. The standard
+    error of each value is estimated from the spread of the per-source
+    dependencies, it is 0 for every node when all sources are used.
+
+    Args:
+        G (nx.MultiDiGraph): street network graph
+        k (int, optional): number of sources to sample, all nodes if None
+        seed (int, optional): seed of the random source sample
+        weight (str, optional): edge attribute to minimize. Defaults to 'length'.
+        edges (bool, optional): compute edge instead of node centrality
+        normalized (bool, optional): normalize like networkx. Defaults to True.
+        workers (int, optional): number of processes. Defaults to 1.
+
+    Returns:
+        tuple[dict, dict]: centrality and its standard error, keyed by node
+            or (u, v, key) edge
+    """
+    nodes = list(G)
+    n = len(nodes)
+    sources = nodes if k is None or k >= n \
+            else random.Random(seed).sample(nodes, k)
+    k = len(sources)
+
+    total, squares = accumulate_dependencies(G, sources, weight, edges, workers)
+    scale = _scale(n, edges, normalized) * n / k if k else 0.0
+
+    keys = [(u, v) for u, v in G.edges()] if edges else nodes
+    bc, err = {}, {}
+    # finite population correction, sources are drawn without replacement
+    fpc = (n - k) / (n - 1) if n > 1 else 0.0
+    for key in keys:
+        t = total.get(key, 0.0)
+        bc[key] = t * scale
+        if k > 1:
+            var = max(squares.get(key, 0.0) - t * t / k, 0.0) / (k - 1)
+            err[key] = scale * math.sqrt(var * fpc * k)
+        else:
+            err[key] = math.inf if k < n else 0.0
+
+    if edges:
+        return _edge_keys(G, bc, weight), _edge_keys(G, err, weight)
+    return bc, err
+
+
+def node_betweenness(G: nx.MultiDiGraph, weight: Optional[str]='length',
+        normalized: bool=True, k: Optional[int]=None, seed: Optional[int]=None,
+        workers: int=1) -> dict:
+    """betweenness centrality of the nodes of a street network
+
+    exact by default, gives the same values as
+    `nx.betweenness_centrality(ox.get_digraph(G), weight=weight)`. Pass k
+    to estimate from a sample of sources, see `sampled_betweenness`.
+
+    Returns:
+        dict: node -> centrality
+    """
+    return sampled_betweenness(G, k, seed, weight, False, normalized,
+            workers)[0]
+
+
+def edge_betweenness(G: nx.MultiDiGraph, weight: Optional[str]=None,
+        normalized: bool=True, k: Optional[int]=None, seed: Optional[int]=None,
+        workers: int=1) -> dict:
+    """betweenness centrality of the edges of a street network
+
+    exact by default, gives the same values as
+    `nx.edge_betweenness_centrality(G, weight=weight)`. Pass k to
+    estimate from a sample of sources, see `sampled_betweenness`.
+
+    Returns:
+        dict: (u, v, key) -> centrality
+    """
+    return sampled_betweenness(G, k, seed, weight, True, normalized,
+            workers)[0]
+
+
+def tail_sums(G: nx.MultiDiGraph, u: Hashable, weight: Optional[str],
+        in_count: dict, in_half: dict) -> tuple[Any, int, float, dict]:
+    """distances from every edge to the edges leaving node u
+
+    the line graph distance from edge (a, b) to edge (u, v) is the node
+    distance from b to u plus one hop, or plus half the length of both
+    edges when weighted. The sum over all edges is grouped by their
+    head node, so it only needs one reverse search from u.
+
+    Returns:
+        tuple: u, number and total distance of the edges that reach u,
+            distance to u from the heads of u's edges
+    """
+    dist, _ = dijkstra(G, u, weight=weight, reverse=True)
+    hop = 1 if weight is None else 0
+    reached, total = 0, 0.0
+    for x, d in dist.items():
+        reached += in_count.get(x, 0)
+        total += in_count.get(x, 0) * (d + hop) + in_half.get(x, 0.0)
+    return u, reached, total, {v: dist[v] for v in G.adj[u] if v in dist}
+
+
+def edge_closeness(G: nx.MultiDiGraph, weight: Optional[str]=None,
+        wf_improved: bool=True, workers: int=1) -> dict:
+    """closeness centrality of the edges of a street network
+
+    computed from node to node distances on the graph itself instead of
+    on `nx.line_graph(G)`, memory grows with the size of G. Unweighted it
+    gives the same values as `nx.closeness_centrality(nx.line_graph(G))`.
+    With a weight, distances are measured between edge midpoints.
+
+    Args:
+        G (nx.MultiDiGraph): street network graph
+        weight (str, optional): edge attribute for distance, hop count if None
+        wf_improved (bool, optional): scale by the fraction of reachable
+            edges, as networkx does. Defaults to True.
+        workers (int, optional): number of processes. Defaults to 1.
+
+    Returns:
+        dict: (u, v, key) -> centrality
+    """
+    m = G.number_of_edges()
+    in_count, in_half = {}, {}
+    for _, v, d in G.edges(data=True):
+        in_count[v] = in_count.get(v, 0) + 1
+        if weight is not None:
+            in_half[v] = in_half.get(v, 0.0) + d.get(weight, 1) / 2
+
+    tails = [u for u in G if G.adj[u]]
+    if workers > 1 and len(tails) > 1:
+        jobs = [(tails[i::workers], weight, in_count, in_half)
+                for i in range(workers)]
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                initargs=(G,)) as pool:
+            sums = [t for part in pool.map(_worker_tail_sums, jobs) for t in part]
+    else:
+        sums = [tail_sums(G, u, weight, in_count, in_half) for u in tails]
+
+    hop = 1 if weight is None else 0
+    cc = {}
+    for u, reached, total, head_dist in sums:
+        for v, keydict in G.adj[u].items():
+            for k, d in keydict.items():
+                half = 0.0 if weight is None else d.get(weight, 1) / 2
+                r, s = reached, total
+                if v in head_dist:
+                    # leave out the edge's distance to itself
+                    r -= 1
+                    s -= head_dist[v] + hop + half
+                s += r * half
+                c = r / s if s > 0 else 0.0
+                if wf_improved and m > 1:
+                    c *= r / (m - 1)
+                cc[(u, v, k)] = c
+    return cc
@@ -0,0 +1,246 @@
+import json
+import os
+from heapq import heappush, heappop
+from typing import Any, Optional
+
+import numpy
+import networkx as nx
+
+from .spatial import NodeIndex
+
+
+class CSRGraph:
+    """compact array backed view of a street network graph
+
+    nodes are stored as positions 0..n-1 in `ids`, `x` and `y`. The
+    outgoing edges of node i are at positions indptr[i]:indptr[i+1] of
+    the edge arrays `indices` (target node position), `key` and `length`.
+    The osmid(s) of edge j are osmid[osmid_ptr[j]:osmid_ptr[j+1]].
+
+    it only keeps what routing, snapping and indicators need, so it takes
+    a fraction of the memory of the networkx graph it is built from
+    """
+
+    arrays = ('ids', 'x', 'y', 'indptr', 'indices', 'key', 'length',
+              'osmid_ptr', 'osmid')
+
+    def __init__(self, ids, x, y, indptr, indices, key, length, osmid_ptr,
+            osmid, crs: Optional[str]=None):
+        self.ids = ids
+        self.x = x
+        self.y = y
+        self.indptr = indptr
+        self.indices = indices
+        self.key = key
+        self.length = length
+        self.osmid_ptr = osmid_ptr
+        self.osmid = osmid
+        self.crs = crs
+
+        # lookup structures, built on first use
+        self._order: Optional[numpy.ndarray] = None
+        self._sorted_ids: Optional[numpy.ndarray] = None
+        self._id_list: Optional[list] = None
+        self._node_index: Optional[NodeIndex] = None
+
+    @classmethod
+    def from_graph(cls, G: nx.MultiDiGraph) -> 'CSRGraph':
+        """build compact graph from a networkx graph produced by osmnx
+
+        Args:
+            G (nx.MultiDiGraph): street network graph
+
+        Returns:
+            CSRGraph: compact graph
+        """
+        nodes = list(G.nodes)
+        pos = {node: i for i, node in enumerate(nodes)}
+        x = numpy.fromiter((G.nodes[n]['x'] for n in nodes), float, len(nodes))
+        y = numpy.fromiter((G.nodes[n]['y'] for n in nodes), float, len(nodes))
+
+        indptr = numpy.zeros(len(nodes) + 1, dtype=numpy.int64)
+        indices, keys, lengths, osmid_ptr, osmids = [], [], [], [0], []
+        for i, u in enumerate(nodes):
+            for v, keydict in G.adj[u].items():
+                for k, d in keydict.items():
+                    indices.append(pos[v])
+                    keys.append(k)
+                    lengths.append(d.get('length', numpy.nan))
+                    osmid = d.get('osmid', [])
+                    osmids.extend(osmid if isinstance(osmid, list) else [osmid])
+                    osmid_ptr.append(len(osmids))
+            indptr[i + 1] = len(indices)
+
+        crs = G.graph.get('crs')
+        return cls(numpy.array(nodes, dtype=numpy.int64), x, y, indptr,
+                numpy.array(indices, dtype=numpy.int32),
+                numpy.array(keys, dtype=numpy.int32),
+                numpy.array(lengths, dtype=float),
+                numpy.array(osmid_ptr, dtype=numpy.int64),
+                numpy.array(osmids, dtype=numpy.int64),
+                crs=None if crs is None else str(crs))
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    @property
+    def nbytes(self) -> int:
+        """total size of the arrays in bytes"""
+        return sum(getattr(self, a).nbytes for a in self.arrays)
+
+    def number_of_edges(self) -> int:
+        return len(self.indices)
+
+    def index(self, node_ids) -> numpy.ndarray:
+        """get the positions of node ids in the arrays
+
+        Raises:
+            KeyError: if any of the ids is not a node of the graph
+        """
+        if self._order is None:
+            self._order = numpy.argsort(self.ids)
+            self._sorted_ids = self.ids[self._order]
+        node_ids = numpy.asarray(node_ids, dtype=numpy.int64)
+        sorted_ids = self._sorted_ids
+        found = numpy.searchsorted(sorted_ids, node_ids)
+        found = numpy.clip(found, 0, len(sorted_ids) - 1)
+        if not numpy.all(sorted_ids[found] == node_ids):
+            raise KeyError("CSRGraph: node ids not in graph")
+        return self._order[found]
+
+    def successors(self, node: Any) -> numpy.ndarray:
+        """get ids of the nodes reachable with one edge from node"""
+        i = self.index([node])[0]
+        return self.ids[self.indices[self.indptr[i]:self.indptr[i + 1]]]
+
+    def edge_osmids(self, j: int) -> list[int]:
+        """get the osmid(s) of the edge at position j"""
+        return self.osmid[self.osmid_ptr[j]:self.osmid_ptr[j + 1]].tolist()
+
+    def dijkstra(self, source: Any, targets=None, cutoff: Optional[float]=None,
+            weight: Optional[str]='length') -> tuple[dict, dict]:
+        """single source dijkstra search, see `routing.dijkstra`
+
+        edges are weighted by their length, or count as one hop if
+        weight is None
+
+        Returns:
+            tuple[dict, dict]: distance to and predecessor of each settled node
+
+        Raises:
+            ValueError: if weight is not 'length' or None, the only edge
+                attribute kept in the arrays is the length
+        """
+        if weight not in ('length', None):
+            raise ValueError(f"CSRGraph.dijkstra: edges can only be weighted "
+                    f"by 'length' or None (hops), not {weight!r}")
+        src = int(self.index([source])[0])
+        remaining = None if targets is None \
+                else set(self.index(list(targets)).tolist())
+        indptr, indices = self.indptr, self.indices
+        length = self.length if weight is not None \
+                else numpy.ones(len(indices))
+
+        dist, pred, seen = {}, {src: -1}, {src: 0.0}
+        heap = [(0.0, src)]
+        while heap:
+            d, u = heappop(heap)
+            if u in dist:
+                continue
+            dist[u] = d
+            if remaining is not None:
+                remaining.discard(u)
+                if not remaining:
+                    break
+            start, end = indptr[u], indptr[u + 1]
+            for v, w in zip(indices[start:end].tolist(),
+                    length[start:end].tolist()):
+                vd = d + w
+                if cutoff is not None and vd > cutoff:
+                    continue
+                if v not in seen or vd < seen[v]:
+                    seen[v] = vd
+                    pred[v] = u
+                    heappush(heap, (vd, v))
+
+        ids = self.id_list()
+        return ({ids[u]: d for u, d in dist.items()},
+                {ids[v]: (None if u < 0 else ids[u]) for v, u in pred.items()})
+
+    def id_list(self) -> list:
+        """get the node ids as a python list, built once"""
+        if self._id_list is None:
+            self._id_list = self.ids.tolist()
+        return self._id_list
+
+    def node_index(self) -> NodeIndex:
+        """get spatial index over the node coordinates"""
+        if self._node_index is None:
+            self._node_index = NodeIndex(self.ids, self.x, self.y, self.crs)
+        return self._node_index
+
+    def nearest_nodes(self, x, y, return_dist: bool=False):
+        """get the ids of the nodes nearest to some coordinates
+
+        coordinates must be in the crs of the graph
+
+        Args:
+            x (array_like): x coordinates / longitudes
+            y (array_like): y coordinates / lattitudes
+            return_dist (bool, optional): also return the distances
+        """
+        ids, dist = self.node_index().query(x, y)
+        return (ids, dist) if return_dist else ids
+
+    def degree(self) -> numpy.ndarray:
+        """get the total (in + out) degree of each node"""
+        out_deg = numpy.diff(self.indptr)
+        in_deg = numpy.bincount(self.indices, minlength=len(self))
+        return out_deg + in_deg
+
+    def stats(self) -> dict:
+        """basic size and length indicators of the network
+
+        Returns:
+            dict: n, m, k_avg, edge_length_total, edge_length_avg,
+                self_loop_proportion
+        """
+        n, m = len(self), self.number_of_edges()
+        sources = numpy.repeat(numpy.arange(n), numpy.diff(self.indptr))
+        return {
+            'n': n,
+            'm': m,
+            'k_avg': 2 * m / n if n else 0,
+            'edge_length_total': float(numpy.nansum(self.length)),
+            'edge_length_avg': float(numpy.nanmean(self.length)) if m else 0,
+            'self_loop_proportion':
+                float(numpy.mean(sources == self.indices)) if m else 0,
+        }
+
+    def save(self, path: str):
+        """save the arrays to a directory of .npy files
+
+        Args:
+            path (str): directory to save to
+        """
+        os.makedirs(path, exist_ok=True)
+        for name in self.arrays:
+            numpy.save(os.path.join(path, f"{name}.npy"), getattr(self, name))
+        with open(os.path.join(path, 'csr.json'), 'w') as f:
+            json.dump({'crs': self.crs}, f)
+
+    @classmethod
+    def load(cls, path: str, mmap: bool=True) -> 'CSRGraph':
+        """load compact graph saved with `CSRGraph.save`
+
+        Args:
+            path (str): directory to load from
+            mmap (bool, optional): memory-map the arrays instead of reading
+                them. Defaults to True.
+        """
+        mode = 'r' if mmap else None
+        arrays = [numpy.load(os.path.join(path, f"{name}.npy"), mmap_mode=mode)
+                for name in cls.arrays]
+        with open(os.path.join(path, 'csr.json')) as f:
+            meta = json.load(f)
+        return cls(*arrays, crs=meta['crs'])
@@ -0,0 +1,442 @@
+import gzip
+import hashlib
+import importlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager, nullcontext
+from typing import Any, Callable, Iterator, Optional
+
+import geopandas
+import networkx as nx
+import numpy
+import osmnx as ox
+from shapely import wkb
+from shapely.geometry import box
+from shapely.geometry.base import BaseGeometry
+from shapely.ops import unary_union
+
+
+# osmnx functions that download overpass responses for a polygon,
+# (module, function, kind) for osmnx 1.x and 2.x
+_DOWNLOADERS = [
+    ('osmnx.downloader', '_osm_network_download', 'network'),
+    ('osmnx.downloader', '_osm_geometries_download', 'geometries'),
+    ('osmnx._overpass', '_download_overpass_network', 'network'),
+    ('osmnx._overpass', '_download_overpass_features', 'geometries'),
+]
+
+# errors osmnx raises when an area has no street network
+_EMPTY_ERRORS = tuple(getattr(importlib.import_module('osmnx._errors'), name)
+        for name in ('EmptyOverpassResponse', 'InsufficientResponseError')
+        if hasattr(importlib.import_module('osmnx._errors'), name))
+
+# patched osmnx download functions, see `OSMCache.patch`
+_patch_lock = threading.Lock()
+_patch_state = {'depth': 0, 'patched': [], 'use_cache': None}
+
+
+class OfflineError(RuntimeError):
+    """raised in offline mode when a request is not covered by the cache"""
+
+
+class OSMCache:
+    """compressed store of overpass responses indexed by area and query
+
+    every entry holds the (gzipped json) responses of one download, the
+    polygon it covers and the query parameters (network type, custom
+    filter or geometry tags). A request is served from the store when
+    the polygons of entries with the same query cover its polygon, osmnx
+    truncates the result to the requested polygon.
+
+    reading an entry marks it as recently used, the least recently used
+    entries are evicted when the store grows over `max_bytes`. In
+    offline mode requests that are not covered raise `OfflineError`
+    instead of going to the network.
+    """
+
+    def __init__(self, directory: str='cache/osm', max_bytes: int=1 << 30,
+            offline: bool=False):
+        """
+        Args:
+            directory (str, optional): directory to store responses in
+            max_bytes (int, optional): maximum total size of the responses
+            offline (bool, optional): never download, fail fast on misses
+        """
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.offline = offline
+        self.lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        self.db = sqlite3.connect(os.path.join(directory, 'index.sqlite'),
+                check_same_thread=False)
+        self.db.executescript("""
+            CREATE TABLE IF NOT EXISTS entries (
+                key TEXT PRIMARY KEY, kind TEXT, query TEXT,
+                minx REAL, miny REAL, maxx REAL, maxy REAL, polygon BLOB,
+                size INTEGER, used REAL);
+            CREATE INDEX IF NOT EXISTS entries_query ON entries (kind, query);
+        """)
+
+    @staticmethod
+    def query(*args, **kwargs) -> str:
+        """canonical text of the query parameters of a download"""
+        return json.dumps([args, kwargs], sort_keys=True, default=str)
+
+    def key(self, kind: str, query: str, polygon: BaseGeometry) -> str:
+        h = hashlib.sha1(f"{kind}\n{query}\n".encode())
+        h.update(polygon.wkb)
+        return h.hexdigest()
+
+    def path(self, key: str) -> str:
+        """get file path of an entry"""
+        return os.path.join(self.directory, f"{key}.json.gz")
+
+    def get(self, kind: str, query: str, polygon: BaseGeometry) \
+            -> Optional[list[dict]]:
+        """get stored responses covering a polygon, None if the polygon
+        is not covered
+
+        Args:
+            kind (str): 'network' or 'geometries'
+            query (str): query parameters, see `OSMCache.query`
+            polygon (BaseGeometry): area of the request
+        """
+        minx, miny, maxx, maxy = polygon.bounds
+        with self.lock:
+            rows = self.db.execute("SELECT key, polygon FROM entries WHERE "
+                    "kind=? AND query=? AND minx<=? AND miny<=? AND maxx>=? "
+                    "AND maxy>=?", (kind, query, maxx, maxy, minx, miny)
+                    ).fetchall()
+        exact = self.key(kind, query, polygon)
+        entries = {k: wkb.loads(bytes(p)) for k, p in rows}
+        covering = [k for k, p in entries.items() if p.covers(polygon)]
+        if exact in entries:
+            keys = [exact]
+        elif covering:
+            keys = covering[:1]
+        else:
+            # use every overlapping entry if together they cover it
+            keys = [k for k, p in entries.items() if p.intersects(polygon)]
+            if not keys or not unary_union(
+                    [entries[k] for k in keys]).covers(polygon):
+                return None
+
+        responses = []
+        try:
+            for k in keys:
+                with gzip.open(self.path(k), 'rt') as f:
+                    responses.extend(json.load(f))
+        except (FileNotFoundError, EOFError, OSError, ValueError):
+            self.remove(keys)
+            return None
+        with self.lock, self.db:
+            self.db.executemany("UPDATE entries SET used=? WHERE key=?",
+                    [(time.time(), k) for k in keys])
+        return responses
+
+    def put(self, kind: str, query: str, polygon: BaseGeometry,
+            responses: list[dict]):
+        """store the responses of a download, evicting old entries if the
+        store is too big
+        """
+        key = self.key(kind, query, polygon)
+        tmp = f"{self.path(key)}.{threading.get_ident()}.tmp"
+        with gzip.open(tmp, 'wt') as f:
+            json.dump(responses, f)
+        os.replace(tmp, self.path(key))
+        with self.lock, self.db:
+            self.db.execute("INSERT OR REPLACE INTO entries VALUES "
+                    "(?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (key, kind, query, *polygon.bounds, polygon.wkb,
+                    os.path.getsize(self.path(key)), time.time()))
+        self.evict()
+
+    def fetch(self, kind: str, query: str, polygon: BaseGeometry,
+            download: Callable[[], Any]) -> list[dict]:
+        """get stored responses or download and store them
+
+        Raises:
+            OfflineError: in offline mode if the polygon is not covered
+        """
+        responses = self.get(kind, query, polygon)
+        if responses is None:
+            if self.offline:
+                raise OfflineError(f"OSMCache: {kind} request {query} "
+                        f"for {polygon.bounds} is not cached")
+            responses = list(download())
+            self.put(kind, query, polygon, responses)
+        return responses
+
+    def size(self) -> int:
+        """total size of the stored responses in bytes"""
+        with self.lock:
+            return self.db.execute(
+                    "SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+
+    def remove(self, keys: list[str]):
+        """remove entries from the store"""
+        with self.lock, self.db:
+            self.db.executemany("DELETE FROM entries WHERE key=?",
+                    [(k,) for k in keys])
+        for k in keys:
+            if os.path.isfile(self.path(k)):
+                os.remove(self.path(k))
+
+    def evict(self):
+        """remove least recently used entries until the store is under
+        `max_bytes`
+        """
+        with self.lock:
+            rows = self.db.execute(
+                    "SELECT key, size FROM entries ORDER BY used").fetchall()
+        total = sum(size for _, size in rows)
+        stale = []
+        for key, size in rows:
+            if total <= self.max_bytes:
+                break
+            stale.append(key)
+            total -= size
+        if stale:
+            self.remove(stale)
+
+    def clear(self):
+        """remove every entry"""
+        with self.lock:
+            keys = [k for k, in self.db.execute("SELECT key FROM entries")]
+        self.remove(keys)
+
+    def _wrap(self, kind: str, download: Callable) -> Callable:
+        def cached_download(polygon, *args, **kwargs):
+            return self.fetch(kind, self.query(*args, **kwargs), polygon,
+                    lambda: download(polygon, *args, **kwargs))
+        return cached_download
+
+    @contextmanager
+    def patch(self) -> Iterator['OSMCache']:
+        """send the overpass downloads of osmnx through the store while
+        in the context
+
+        osmnx's own response cache is turned off in the context so
+        responses are not stored twice. Contexts can be nested and
+        entered from several threads, the store of the first context
+        entered is used until the last one exits.
+        """
+        with _patch_lock:
+            if _patch_state['depth'] == 0:
+                for module, name, kind in _DOWNLOADERS:
+                    try:
+                        mod = importlib.import_module(module)
+                    except ImportError:
+                        continue
+                    download = getattr(mod, name, None)
+                    if download is not None:
+                        _patch_state['patched'].append((mod, name, download))
+                        setattr(mod, name, self._wrap(kind, download))
+                _patch_state['use_cache'] = ox.settings.use_cache
+                ox.settings.use_cache = False
+            _patch_state['depth'] += 1
+        try:
+            yield self
+        finally:
+            with _patch_lock:
+                _patch_state['depth'] -= 1
+                if _patch_state['depth'] == 0:
+                    ox.settings.use_cache = _patch_state['use_cache']
+                    for mod, name, download in _patch_state['patched']:
+                        setattr(mod, name, download)
+                    _patch_state['patched'].clear()
+
+
+# store used when downloads are made with osm_cache=True
+osm_cache: Optional[OSMCache] = None
+
+
+def default_osm_cache() -> OSMCache:
+    """get the shared store in cache/osm, it is created on first use"""
+    global osm_cache
+    if osm_cache is None:
+        osm_cache = OSMCache()
+    return osm_cache
+
+
+def osm_requests(cache: bool | OSMCache=True):
+    """context in which osmnx downloads go through an `OSMCache`
+
+    Args:
+        cache (bool | OSMCache): store to use, `default_osm_cache()` if
+            True, download without storing if False
+    """
+    if cache is False or cache is None:
+        return nullcontext()
+    return (default_osm_cache() if cache is True else cache).patch()
+
+
+def combine_tags(layers: dict[str, dict]) -> dict:
+    """combine the osm tags of several layers into the tags of one query
+
+    a tag is True (any value) if any layer asks for any value of it,
+    otherwise the values of all layers are listed
+    """
+    combined = {}
+    for tags in layers.values():
+        for tag, value in tags.items():
+            if value is True or combined.get(tag) is True:
+                combined[tag] = True
+            else:
+                values = [value] if isinstance(value, str) else value
+                combined[tag] = sorted(set(combined.get(tag, [])) | set(values))
+    return combined
+
+
+def select_tags(data: geopandas.GeoDataFrame, tags: dict) \
+        -> geopandas.GeoDataFrame:
+    """select the osm entities matching any of the tags, like osmnx
+    does for the tags of a query
+
+    columns without values in the selection are dropped
+    """
+    mask = numpy.zeros(len(data), dtype=bool)
+    for tag, value in tags.items():
+        if tag not in data.columns:
+            continue
+        col = data[tag]
+        if value is True:
+            mask |= col.notna().to_numpy()
+        else:
+            mask |= col.isin([value] if isinstance(value, str) else value).to_numpy()
+    selected = data[mask]
+    return selected.dropna(axis=1, how='all') if len(selected) else selected
+
+
+def grid_tiles(polygon: BaseGeometry, tile_size: float) -> list[BaseGeometry]:
+    """split a polygon into the cells of a square grid
+
+    Args:
+        polygon (BaseGeometry): area to split
+        tile_size (float): width/height of the cells in the units of the
+            polygon (degrees for lat/long)
+
+    Returns:
+        list[BaseGeometry]: non empty parts of the polygon in each cell
+    """
+    minx, miny, maxx, maxy = polygon.bounds
+    xs = numpy.append(numpy.arange(minx, maxx, tile_size), maxx)
+    ys = numpy.append(numpy.arange(miny, maxy, tile_size), maxy)
+    tiles = []
+    for x0, x1 in zip(xs[:-1], xs[1:]):
+        for y0, y1 in zip(ys[:-1], ys[1:]):
+            tile = polygon.intersection(box(x0, y0, x1, y1))
+            if not tile.is_empty and tile.area > 0:
+                tiles.append(tile)
+    return tiles
+
+
+def stitch_graphs(graphs: list[nx.MultiDiGraph]) -> nx.MultiDiGraph:
+    """merge the graphs of overlapping tiles into one graph
+
+    nodes and edges are keyed by their osm ids, so nodes and edges found
+    in more than one tile are kept once
+    """
+    G = nx.compose_all(graphs)
+    G.graph = dict(graphs[0].graph)
+    return G
+
+
+def truncate_graph(G: nx.MultiDiGraph, polygon: BaseGeometry,
+        truncate_by_edge: bool=False) -> nx.MultiDiGraph:
+    """remove the nodes outside a polygon, in place
+
+    Args:
+        truncate_by_edge (bool, optional): keep nodes outside the polygon
+            at the ends of edges crossing it
+    """
+    nodes = list(G.nodes)
+    x = numpy.fromiter((G.nodes[n]['x'] for n in nodes), float, len(nodes))
+    y = numpy.fromiter((G.nodes[n]['y'] for n in nodes), float, len(nodes))
+    inside = geopandas.GeoSeries(geopandas.points_from_xy(x, y)) \
+            .intersects(polygon).to_numpy()
+    keep = {n for n, i in zip(nodes, inside) if i}
+    if truncate_by_edge:
+        keep |= {v for u in keep for v in nx.all_neighbors(G, u)}
+    G.remove_nodes_from([n for n in nodes if n not in keep])
+    return G
+
+
+def count_streets_per_node(G: nx.MultiDiGraph, nodes=None) -> dict:
+    """count the physical streets meeting at each node, osmnx moved this
+    from `utils_graph` (1.x) to `stats`"""
+    module = ox.stats if hasattr(ox.stats, 'count_streets_per_node') \
+            else ox.utils_graph
+    return module.count_streets_per_node(G, nodes=nodes)
+
+
+def tiled_graph(polygon: BaseGeometry, tile_size: float=0.05,
+        workers: int=4, fetch: Optional[Callable[..., nx.MultiDiGraph]]=None,
+        buffer: float=0.005, simplify: bool=True, retain_all: bool=False,
+        truncate_by_edge: bool=False, **kwargs) -> nx.MultiDiGraph:
+    """download the street network of a large area tile by tile
+
+    the polygon is split into a grid (see `grid_tiles`), the tiles are
+    downloaded concurrently by a pool of `workers` threads and stitched
+    into one graph (see `stitch_graphs`). Like osmnx, the tiles cover the
+    polygon with a buffer and the graph is simplified before it is
+    truncated to the polygon, so streets at its edge are simplified the
+    same way. Tiles without streets are skipped.
+
+    tiles are downloaded with `fetch`, osmnx's graph_from_polygon by
+    default, so a local overpass server can be used by pointing osmnx's
+    overpass endpoint setting at it or a stand-in can be passed as fetch
+
+    Args:
+        polygon (BaseGeometry): lat/long area to download
+        tile_size (float, optional): size of the tiles in degrees
+        workers (int, optional): number of concurrent downloads
+        fetch (Callable, optional): function downloading the graph of a
+            tile, called like osmnx.graph_from_polygon
+        buffer (float, optional): buffer around the polygon in degrees,
+            about 500 meters by default
+        simplify (bool, optional): simplify the stitched graph
+        retain_all (bool, optional): keep every connected component
+            instead of only the largest
+        truncate_by_edge (bool, optional): keep nodes outside the polygon
+            at the ends of edges crossing it
+        **kwargs: keyword args passed to fetch, such as network_type
+
+    Returns:
+        nx.MultiDiGraph: street network graph
+    """
+    fetch = fetch or ox.graph_from_polygon
+
+    def fetch_tile(tile: BaseGeometry) -> Optional[nx.MultiDiGraph]:
+        try:
+            return fetch(tile, simplify=False, retain_all=True,
+                    truncate_by_edge=True, **kwargs)
+        except _EMPTY_ERRORS:
+            return None
+        except ValueError as e:
+            # osmnx raises a plain ValueError for tiles without nodes
+            if 'no graph nodes' in str(e):
+                return None
+            raise
+
+    tiles = grid_tiles(polygon.buffer(buffer), tile_size)
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        graphs = [G for G in pool.map(fetch_tile, tiles) if G is not None]
+    if not graphs:
+        raise ValueError("tiled_graph: found no street network in polygon")
+
+    G = stitch_graphs(graphs)
+    if simplify:
+        G = ox.simplify_graph(G)
+    # nodes on tile seams only have the street count of one tile, count
+    # on the buffered graph so nodes at the edge of the polygon keep the
+    # streets leading out of it
+    nx.set_node_attributes(G, count_streets_per_node(G), 'street_count')
+    truncate_graph(G, polygon, truncate_by_edge)
+    if not retain_all and len(G):
+        G = G.subgraph(max(nx.weakly_connected_components(G), key=len)).copy()
+    return G
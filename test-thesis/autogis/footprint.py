@@ -0,0 +1,125 @@
+import os
+from collections import OrderedDict
+
+import numpy
+import pandas
+import geopandas
+import osmnx as ox
+from shapely.geometry.base import BaseGeometry
+
+from .download import OSMCache, osm_requests
+
+# osm building attributes stored as float columns, missing or invalid
+# values are 0
+HEIGHT_COLUMNS = ('height', 'min_height', 'building:levels')
+
+# other building attributes kept in the store
+KEEP_COLUMNS = ('element_type', 'osmid', 'building', 'name')
+
+
+def parse_heights(values: pandas.Series) -> numpy.ndarray:
+    """parse building heights/levels as floats, values that are not
+    numbers are 0
+    """
+    return pandas.to_numeric(values, errors='coerce').fillna(0) \
+            .to_numpy(dtype=float)
+
+
+def normalize_buildings(data: geopandas.GeoDataFrame) -> geopandas.GeoDataFrame:
+    """keep the polygons and typed attribute columns of buildings
+    downloaded by osmnx
+    """
+    data = data.reset_index()
+    data = data[data.geom_type.isin(['Polygon', 'MultiPolygon'])]
+    columns = {}
+    for col in KEEP_COLUMNS:
+        if col in data.columns:
+            columns[col] = data[col] if col == 'osmid' \
+                    else data[col].astype('string')
+    for col in HEIGHT_COLUMNS:
+        columns[col] = parse_heights(data[col]) if col in data.columns \
+                else numpy.zeros(len(data))
+    return geopandas.GeoDataFrame(columns, geometry=data.geometry.values,
+            crs=data.crs).reset_index(drop=True)
+
+
+class FootprintStore:
+    """GeoParquet store of the building footprints of study areas
+
+    footprints of an area are stored next to its graphml file as
+    `{path}.buildings.parquet` in lat/long with float height columns.
+    Loaded footprints and their spatial index are kept in memory, the
+    last `size` areas are kept.
+    """
+
+    def __init__(self, size: int=8, osm_cache: bool | OSMCache=True):
+        """
+        Args:
+            size (int, optional): number of areas kept in memory
+            osm_cache (bool | OSMCache, optional): see `osm_requests`
+        """
+        self.size = size
+        self.osm_cache = osm_cache
+        self._loaded: OrderedDict = OrderedDict()
+
+    def path(self, path: str) -> str:
+        """get file path of the footprints of an area
+
+        Args:
+            path (str): path of the graphml file without extension
+        """
+        return f"{path}.buildings.parquet"
+
+    def save(self, path: str, buildings: geopandas.GeoDataFrame):
+        """normalize and save footprints downloaded by osmnx"""
+        file = self.path(path)
+        normalize_buildings(buildings).to_parquet(f"{file}.tmp")
+        os.replace(f"{file}.tmp", file)
+
+    def load(self, path: str) -> geopandas.GeoDataFrame:
+        """load the stored footprints of an area, building their spatial
+        index"""
+        file = self.path(path)
+        key = (os.path.abspath(file), os.path.getmtime(file))
+        if key not in self._loaded:
+            buildings = geopandas.read_parquet(file)
+            # build the spatial index once, when the file is read
+            buildings.sindex
+            self._loaded[key] = buildings
+            while len(self._loaded) > self.size:
+                self._loaded.popitem(last=False)
+        self._loaded.move_to_end(key)
+        return self._loaded[key]
+
+    def fetch(self, path: str, center: tuple[float, float], dist: float=700) \
+            -> geopandas.GeoDataFrame:
+        """get stored footprints of an area or download and store them
+
+        footprints saved as GeoJSON by earlier versions are converted
+
+        Args:
+            path (str): path of the graphml file without extension
+            center (tuple[float, float]): (lat, long) center of the area
+            dist (float, optional): distance in meters around the center
+        """
+        if not os.path.isfile(self.path(path)):
+            if os.path.isfile(f"{path}.geojson"):
+                buildings = geopandas.read_file(f"{path}.geojson")
+            else:
+                with osm_requests(self.osm_cache):
+                    buildings = ox.geometries_from_point(center, dist=dist,
+                            tags={'building': True})
+            self.save(path, buildings)
+        return self.load(path)
+
+    def clip(self, path: str, polygon: BaseGeometry) -> geopandas.GeoDataFrame:
+        """get the stored footprints of an area intersecting a lat/long
+        polygon, using the spatial index
+        """
+        buildings = self.load(path)
+        return buildings.iloc[buildings.sindex.query(polygon,
+                predicate='intersects')].sort_index()
+
+
+# store used by `building_footprint_from_graph`
+footprint_store = FootprintStore()
@@ -0,0 +1,345 @@
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Optional
+
+import numpy
+import pandas
+import geopandas
+from shapely.geometry import Point
+
+from .spatial import NodeIndex
+
+
+def _label(name) -> Optional[str]:
+    """turn an osm name attribute (str, list of str or missing) into a label
+    """
+    if isinstance(name, list):
+        name = ' / '.join(str(n) for n in name if isinstance(n, str))
+    if not isinstance(name, str) or not name or name == 'nan':
+        return None
+    return name
+
+
+def densify(geoms: geopandas.GeoSeries, spacing: float) \
+        -> tuple[numpy.ndarray, numpy.ndarray, numpy.ndarray]:
+    """sample points along geometries at most `spacing` apart
+
+    Returns:
+        tuple[numpy.ndarray, numpy.ndarray, numpy.ndarray]: x, y and the
+            position of the geometry each point belongs to
+    """
+    xs, ys, owner = [], [], []
+    for i, geom in enumerate(geoms):
+        if geom is None or geom.is_empty:
+            continue
+        if geom.geom_type == 'Point':
+            coords = numpy.array([[geom.x, geom.y]])
+        elif geom.geom_type == 'LineString':
+            coords = numpy.asarray(geom.coords)[:, :2]
+        else:
+            c = geom.representative_point()
+            coords = numpy.array([[c.x, c.y]])
+        if len(coords) > 1:
+            seg = numpy.hypot(*numpy.diff(coords, axis=0).T)
+            steps = numpy.maximum(numpy.ceil(seg / spacing), 1).astype(int)
+            t = numpy.concatenate([numpy.arange(s) / s for s in steps])
+            start = numpy.repeat(coords[:-1], steps, axis=0)
+            delta = numpy.repeat(numpy.diff(coords, axis=0), steps, axis=0)
+            coords = numpy.vstack([start + delta * t[:, None], coords[-1:]])
+        xs.append(coords[:, 0])
+        ys.append(coords[:, 1])
+        owner.append(numpy.full(len(coords), i))
+    if not xs:
+        return numpy.empty(0), numpy.empty(0), numpy.empty(0, dtype=int)
+    return numpy.concatenate(xs), numpy.concatenate(ys), numpy.concatenate(owner)
+
+
+class OfflineGeocoder:
+    """reverse geocoder that labels points with the name of the nearest
+    street (or POI) of an already loaded street network
+
+    it makes no network requests, points are looked up in a KD-tree of
+    points sampled along the named edges of the network
+    """
+
+    def __init__(self, features: geopandas.GeoDataFrame, name_col: str='name',
+            place: Optional[str]=None, spacing: Optional[float]=None):
+        """
+        Args:
+            features (geopandas.GeoDataFrame): named edges and/or POIs
+            name_col (str, optional): column with the names. Defaults to 'name'.
+            place (str, optional): appended to every address, e.g. 'Adum, Kumasi'
+            spacing (float, optional): distance between points sampled along
+                edges, in units of the crs. 10m or its equivalent in degrees
+                by default
+        """
+        labels = features[name_col].map(_label) if name_col in features \
+                else pandas.Series(None, index=features.index, dtype=object)
+        named = features[labels.notna()]
+        self.labels = labels[labels.notna()].to_numpy()
+        self.crs = features.crs
+        self.place = place
+
+        if spacing is None:
+            geographic = self.crs is not None and self.crs.is_geographic
+            spacing = 1e-4 if geographic else 10.0
+        x, y, owner = densify(named.geometry, spacing)
+        self.index = NodeIndex(owner, x, y, None if self.crs is None else str(self.crs))
+
+    @classmethod
+    def from_graph(cls, graph, pois: Optional[geopandas.GeoDataFrame]=None,
+            **kwargs) -> 'OfflineGeocoder':
+        """build geocoder from the edges of a `Graph` and optional POIs
+
+        Args:
+            graph (Graph): loaded street network graph
+            pois (geopandas.GeoDataFrame, optional): named points of interest
+            kwargs: keyword arguments for `OfflineGeocoder`
+        """
+        features = graph.edges().E
+        if pois is not None:
+            features = pandas.concat([features[['name', 'geometry']],
+                pois.to_crs(features.crs)[['name', 'geometry']]],
+                ignore_index=True)
+        return cls(geopandas.GeoDataFrame(features, crs=graph.crs()), **kwargs)
+
+    def reverse(self, points: list[Point] | geopandas.GeoSeries,
+            crs='EPSG:4326') -> geopandas.GeoDataFrame:
+        """reverse geocode points
+
+        Args:
+            points (list[Point] | geopandas.GeoSeries): points to label
+            crs (optional): crs of the points if they are not a GeoSeries,
+                lat/long by default
+
+        Returns:
+            geopandas.GeoDataFrame: address and geometry of each point, in the
+                crs of the points
+        """
+        if not isinstance(points, geopandas.GeoSeries):
+            points = geopandas.GeoSeries(points, crs=crs)
+        query = points.to_crs(self.crs) if self.crs is not None else points
+        owner, _ = self.index.query(query.x.to_numpy(), query.y.to_numpy())
+        address = self.labels[owner] if len(self.labels) \
+                else numpy.full(len(points), None)
+        if self.place is not None:
+            address = [None if a is None else f"{a}, {self.place}" for a in address]
+        return geopandas.GeoDataFrame({'address': address},
+                geometry=points.reset_index(drop=True), crs=points.crs)
+
+
+class GeopyProvider:
+    """geocoding service provided by geopy, e.g. 'photon' or 'nominatim'
+    """
+
+    def __init__(self, service: str='photon', **kwargs):
+        """
+        Args:
+            service (str, optional): name of geopy geocoding service
+            kwargs: keyword arguments for the geopy geocoder
+        """
+        from geopy.geocoders import get_geocoder_for_service
+        self.name = service
+        self.geocoder = get_geocoder_for_service(service)(**kwargs)
+
+    def reverse(self, lat: float, lon: float) -> Optional[str]:
+        location = self.geocoder.reverse((lat, lon))
+        return None if location is None else location.address
+
+    def geocode(self, query: str) -> Optional[tuple[float, float, str]]:
+        location = self.geocoder.geocode(query)
+        if location is None:
+            return None
+        return location.latitude, location.longitude, location.address
+
+
+class StubProvider:
+    """local geocoding provider for tests and offline runs
+
+    lookups are answered from dicts or functions, calls are counted in
+    `calls`
+    """
+
+    def __init__(self, reverse=None, geocode=None, name: str='stub'):
+        """
+        Args:
+            reverse (dict | Callable, optional): (lat, lon) -> address
+            geocode (dict | Callable, optional): query -> (lat, lon, address)
+        """
+        self.name = name
+        self._reverse = reverse or {}
+        self._geocode = geocode or {}
+        self.calls = 0
+
+    def reverse(self, lat: float, lon: float) -> Optional[str]:
+        self.calls += 1
+        if callable(self._reverse):
+            return self._reverse(lat, lon)
+        return self._reverse.get((lat, lon))
+
+    def geocode(self, query: str) -> Optional[tuple[float, float, str]]:
+        self.calls += 1
+        if callable(self._geocode):
+            return self._geocode(query)
+        return self._geocode.get(query)
+
+
+class RateLimiter:
+    """thread safe limiter spacing calls at least 1/rate seconds apart"""
+
+    def __init__(self, rate: Optional[float]):
+        self.interval = 0.0 if not rate else 1.0 / rate
+        self.lock = threading.Lock()
+        self.next_call = 0.0
+
+    def wait(self):
+        with self.lock:
+            now = time.monotonic()
+            start = max(now, self.next_call)
+            self.next_call = start + self.interval
+        if start > now:
+            time.sleep(start - now)
+
+
+class GeocodeCache:
+    """sqlite store of geocoding results
+
+    reverse results are keyed by provider and coordinates rounded to
+    `precision` decimals, forward results by provider and address string
+    """
+
+    def __init__(self, path: str='cache/geocode.sqlite', precision: int=5):
+        self.path = path
+        self.precision = precision
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self.db = sqlite3.connect(path)
+        self.db.executescript("""
+            CREATE TABLE IF NOT EXISTS reverse (
+                provider TEXT, lat REAL, lon REAL, address TEXT,
+                PRIMARY KEY (provider, lat, lon));
+            CREATE TABLE IF NOT EXISTS forward (
+                provider TEXT, query TEXT, lat REAL, lon REAL, address TEXT,
+                PRIMARY KEY (provider, query));
+        """)
+
+    def key(self, lat: float, lon: float) -> tuple[float, float]:
+        return round(lat, self.precision), round(lon, self.precision)
+
+    def get_reverse(self, provider: str, keys: list[tuple[float, float]]) -> dict:
+        """get stored addresses of rounded coordinates"""
+        found = {}
+        for lat, lon in set(keys):
+            row = self.db.execute("SELECT address FROM reverse WHERE "
+                    "provider=? AND lat=? AND lon=?", (provider, lat, lon)).fetchone()
+            if row is not None:
+                found[(lat, lon)] = row[0]
+        return found
+
+    def put_reverse(self, provider: str, results: dict):
+        with self.db:
+            self.db.executemany("INSERT OR REPLACE INTO reverse VALUES (?, ?, ?, ?)",
+                    [(provider, lat, lon, a) for (lat, lon), a in results.items()])
+
+    def get_forward(self, provider: str, queries: list[str]) -> dict:
+        """get stored locations of address strings"""
+        found = {}
+        for query in set(queries):
+            row = self.db.execute("SELECT lat, lon, address FROM forward WHERE "
+                    "provider=? AND query=?", (provider, query)).fetchone()
+            if row is not None:
+                found[query] = None if row[0] is None else tuple(row)
+        return found
+
+    def put_forward(self, provider: str, results: dict):
+        with self.db:
+            self.db.executemany(
+                    "INSERT OR REPLACE INTO forward VALUES (?, ?, ?, ?, ?)",
+                    [(provider, q, *(r or (None, None, None)))
+                        for q, r in results.items()])
+
+
+class CachedGeocoder:
+    """geocoder that looks results up in a `GeocodeCache` first
+
+    cache misses are sent to the provider as concurrent requests from a
+    pool of `workers` threads, no more than `rate` requests per second
+    """
+
+    def __init__(self, provider=None, cache: Optional[GeocodeCache]=None,
+            rate: Optional[float]=1.0, workers: int=4):
+        """
+        Args:
+            provider (optional): object with `name`, `reverse(lat, lon)` and
+                `geocode(query)`, `GeopyProvider('photon')` if None
+            cache (GeocodeCache, optional): store of results, a store in
+                cache/geocode.sqlite if None
+            rate (float, optional): maximum requests per second, no limit if None
+            workers (int, optional): number of concurrent requests
+        """
+        self.provider = provider or GeopyProvider()
+        self.cache = cache or GeocodeCache()
+        self.limiter = RateLimiter(rate)
+        self.workers = workers
+
+    def _request(self, func, args):
+        self.limiter.wait()
+        return func(*args)
+
+    def _fetch(self, func, keys: list) -> dict:
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            args = [k if isinstance(k, tuple) else (k,) for k in keys]
+            return dict(zip(keys, pool.map(partial(self._request, func), args)))
+
+    def reverse(self, points: list[Point] | geopandas.GeoSeries,
+            crs='EPSG:4326') -> geopandas.GeoDataFrame:
+        """reverse geocode points, see `OfflineGeocoder.reverse`"""
+        if not isinstance(points, geopandas.GeoSeries):
+            points = geopandas.GeoSeries(points, crs=crs)
+        latlon = points.to_crs('EPSG:4326') if points.crs is not None else points
+        keys = [self.cache.key(lat, lon) for lat, lon in
+                zip(latlon.y.to_numpy(), latlon.x.to_numpy())]
+
+        name = self.provider.name
+        found = self.cache.get_reverse(name, keys)
+        missing = [k for k in dict.fromkeys(keys) if k not in found]
+        if missing:
+            fetched = self._fetch(self.provider.reverse, missing)
+            self.cache.put_reverse(name, fetched)
+            found |= fetched
+        return geopandas.GeoDataFrame({'address': [found[k] for k in keys]},
+                geometry=points.reset_index(drop=True), crs=points.crs)
+
+    def geocode(self, queries: list[str]) -> geopandas.GeoDataFrame:
+        """geocode address strings
+
+        Returns:
+            geopandas.GeoDataFrame: address and lat/long point of each query,
+                missing if it was not found
+        """
+        name = self.provider.name
+        found = self.cache.get_forward(name, queries)
+        missing = [q for q in dict.fromkeys(queries) if q not in found]
+        if missing:
+            fetched = self._fetch(self.provider.geocode, missing)
+            self.cache.put_forward(name, fetched)
+            found |= fetched
+        results = [found[q] or (numpy.nan, numpy.nan, None) for q in queries]
+        lat, lon, address = zip(*results) if results else ((), (), ())
+        return geopandas.GeoDataFrame({'address': list(address)},
+                geometry=geopandas.points_from_xy(lon, lat), crs='EPSG:4326')
+
+
+# geocoder used by `reverse_geocode` when none is given
+_default_geocoder: Optional[CachedGeocoder] = None
+
+
+def default_geocoder() -> CachedGeocoder:
+    """cached photon geocoder, the same service geopandas uses by default"""
+    global _default_geocoder
+    if _default_geocoder is None:
+        _default_geocoder = CachedGeocoder(GeopyProvider('photon'))
+    return _default_geocoder
@@ -1,14 +1,20 @@
-from select import select
-from typing import Any, Callable, Optional
+import os
+import hashlib
+from typing import Any, Callable, Iterator, Optional
 from typing_extensions import Self
+import numpy
 import matplotlib
-from shapely.geometry import Polygon, LineString
+from shapely.geometry import Polygon
 import osmnx as ox
 import networkx as nx
 import matplotlib.pyplot as plt
 
 from .utils import *
 from .route import *
+from .routing import *
+from .spatial import *
+from .download import *
+from .render import *
 
 
 Geometry = tuple[geopandas.GeoDataFrame, dict]
@@ -28,6 +34,10 @@ class Graph:
                 * 'place' : use osmnx.graph_from_place function
                 * 'polygon' : use osmnx.graph_from_polygon function
                 * 'point' : use osmnx.graph_from_point function
+                * 'tiled' : download a large polygon in concurrent tiles,
+                  see `tiled_graph`
+                * 'file' : load graphml file through its binary store,
+                  see `load_graph`
                 * 'route' : get graph from `Route` object
                 * 'custom' : pass custom function in opt_arg parameter
 
@@ -36,6 +46,10 @@ class Graph:
        
         # downloader downloads the graph 
         self.downloader: Optional[Callable[..., nx.MultiDiGraph]] = None
+        self.graph_from = graph_from
+
+        # graphml file the graph was loaded from, if any
+        self.source: Optional[str] = None
 
         match graph_from: 
             case 'bbox':
@@ -48,6 +62,10 @@ class Graph:
                 self.downloader = ox.graph_from_point
             case 'polygon':
                 self.downloader = ox.graph_from_polygon
+            case 'tiled':
+                self.downloader = tiled_graph
+            case 'file':
+                self.downloader = load_graph
             case 'route_polygon':
                 # get graph from origins(s)/destination(s) points
                 self.downloader = opt_arg.graph_from_polygon
@@ -64,6 +82,18 @@ class Graph:
         
         # edges in the graph
         self.E: Optional[geopandas.GeoDataFrame] = None
+
+        # compact array backed copy of G, see `CSRGraph`
+        self.C: Optional[CSRGraph] = None
+
+        # spatial index over node coordinates for snapping points
+        self._node_index: Optional[NodeIndex] = None
+
+        # convex hull of the nodes, see `extent`
+        self._extent: Optional[Polygon] = None
+
+        # store of overpass responses used by downloads, see `osm_requests`
+        self.osm_cache: bool | OSMCache = True
        
         # extra OSM entities in the extent of the graph can be downloaded
         # The Geometry type represents a plottable geometry
@@ -81,40 +111,136 @@ class Graph:
     def graph(self, *args, **kwargs) -> nx.MultiDiGraph:
         """get networkx.MultiDiGraph downloaded by osmnx
 
+        if the graph was projected with `project(lazy=True)`, its edge
+        geometries are projected before it is handed out
+
         Returns:
             networkx.MultiDiGraph: graph downloaded by osmnx
         """
+        return project_edge_geometry(self._graph(*args, **kwargs))
+
+    def _graph(self, *args, **kwargs) -> nx.MultiDiGraph:
+        """get the graph without projecting the edge geometries of a
+        lazily projected graph, for code that only reads nodes and edge
+        lengths (csr, snapping and routing)
+        """
         if self.G is None:
-            self.G = self.downloader(*args, **kwargs)
+            with osm_requests(self.graph_from != 'file' and self.osm_cache):
+                self.G = self.downloader(*args, **kwargs)
+            self._extent = None
+            if self.graph_from == 'file':
+                self.source = args[0] if args else kwargs['path']
         return self.G
 
     def download(self, *args, **kwargs) -> Self:
         """download street network graph from openstreetmap using osmnx
 
+        overpass responses go through `self.osm_cache` (see `OSMCache`),
+        set it to an `OSMCache(offline=True)` to only use stored responses
+        or to False to always download
+
         Returns:
             Self@Graph: object of graph
         """
         self.graph(*args, **kwargs)
         return self
 
-    def project(self, crs=None) -> Self:
+    def project(self, crs=None, lazy: bool=False) -> Self:
         """reproject graph to a crs
         
         it projects to the UTM Zone in which the center
         of the graph lies
 
+        with lazy=True only the node coordinates are transformed (see
+        `project_graph_xy`), which is all routing and snapping need.
+        Nodes/edges geodata are built and edge geometries reprojected the
+        first time they are used.
+
         Args:
             crs (pyproj.CRS | str, optional): crs to project from. Defaults to None.
+            lazy (bool, optional): project node coordinates only
 
         Returns:
             Self@Graph: object of Graph
         """
         if not self._projected:
-            self.G = ox.project_graph(self.graph(), to_crs=crs)
-            self.N, self.E = ox.graph_to_gdfs(self.graph())
+            if lazy:
+                self.G = project_graph_xy(self._graph(), crs)
+                self.N, self.E = None, None
+            else:
+                self.G = ox.project_graph(self.graph(), to_crs=crs)
+                self.N, self.E = map(normalize_schema,
+                        ox.graph_to_gdfs(self.graph()))
+            self.C = None
+            self._node_index = None
+            self._extent = None
             self._projected = True
         return self
     
+    def csr(self) -> CSRGraph:
+        """get compact array backed view of the graph
+
+        routing runs on it instead of `self.G`, see `CSRGraph`. `self.G`
+        is still kept for plotting and the nodes/edges geodata, to route
+        without holding the networkx graph load the compact graph alone
+        with `load_csr`
+
+        Returns:
+            CSRGraph: compact graph
+        """
+        if self.C is None:
+            self.C = CSRGraph.from_graph(self._graph())
+        return self.C
+
+    def node_index_path(self) -> Optional[str]:
+        """get path the node index is saved to, next to the binary store
+        of the graphml file the graph was loaded from
+        """
+        if self.source is None:
+            return None
+        crs = hashlib.sha1(str(self._graph().graph.get('crs')).encode())
+        return os.path.join(store_path(self.source),
+                f"node_index-{crs.hexdigest()[:12]}.pkl")
+
+    def node_index(self) -> NodeIndex:
+        """get spatial index over the coordinates of the nodes
+
+        the index is built once and kept with the graph. If the graph was
+        loaded from a file, the index is also saved next to its binary
+        store and reused by later sessions.
+
+        Returns:
+            NodeIndex: index of the nodes
+        """
+        if self._node_index is None:
+            path = self.node_index_path()
+            if path is not None and os.path.isfile(path) \
+                    and os.path.getmtime(path) >= os.path.getmtime(self.source):
+                self._node_index = NodeIndex.load(path)
+            else:
+                self._node_index = NodeIndex.from_graph(self._graph())
+                if path is not None:
+                    self._node_index.save(path)
+        return self._node_index
+
+    def snap(self, x, y, max_dist: Optional[float]=None,
+            chunksize: int=1_000_000) -> tuple[numpy.ndarray, numpy.ndarray]:
+        """snap points to the nearest nodes of the graph
+
+        coordinates must be in the crs of the graph, see `NodeIndex.query`
+
+        Args:
+            x (array_like): x coordinates / longitudes of the points
+            y (array_like): y coordinates / lattitudes of the points
+            max_dist (float, optional): points further than this get id -1
+            chunksize (int, optional): number of points to query at a time
+
+        Returns:
+            tuple[numpy.ndarray, numpy.ndarray]: nearest node ids, distances
+        """
+        return self.node_index().query(x, y, max_dist=max_dist,
+                chunksize=chunksize)
+
     def nodes(self) -> Self:
         """get nodes/intersection of streets from graph
 
@@ -122,7 +248,8 @@ class Graph:
             Self@Graph: self.G
         """
         if self.N is None:
-            self.N = ox.graph_to_gdfs(self.graph(), nodes=True, edges=False)
+            self.N = normalize_schema(
+                    ox.graph_to_gdfs(self.graph(), nodes=True, edges=False))
         return self
     
     def edges(self) -> Self:
@@ -132,7 +259,8 @@ class Graph:
             Self@Graph: returns the Graph object
         """
         if self.E is None:
-            self.E = ox.graph_to_gdfs(self.graph(), nodes=False, edges=True)
+            self.E = normalize_schema(
+                    ox.graph_to_gdfs(self.graph(), nodes=False, edges=True))
         return self
     
     def nodes_and_edges(self) -> Self:
@@ -146,16 +274,27 @@ class Graph:
     def crs(self):
         """get CRS of the graph
         """
-        return self.nodes().N.crs
+        return CRS.from_user_input(self._graph().graph['crs'])
     
     
     def extent(self) -> Polygon:
         """get entire area that graph covers as a shapely polygon
 
+        it is the convex hull of the coordinates of the nodes and edge
+        geometries, computed once and kept until the graph is downloaded
+        again or projected
+
         Returns:
             Polygon: shapely polygon representing the extent of graph
         """
-        return self.edges().E.unary_union.convex_hull
+        if self._extent is None:
+            C = self.csr()
+            coords = [numpy.column_stack([C.x, C.y])]
+            coords.extend(numpy.asarray(geom.coords) for _, _, geom
+                    in self.graph().edges(data='geometry') if geom is not None)
+            xy = numpy.concatenate(coords)
+            self._extent = convex_hull(xy[:, 0], xy[:, 1])
+        return self._extent
 
     def __add_geometry(self, key: str, geom: geopandas.GeoDataFrame, **kwargs):
         """add new geometry to list of geometries
@@ -202,8 +341,9 @@ class Graph:
         """
         if not key in self.geometries:
             c = self.extent().centroid
-            geom = to_crs(self.crs(),
-                    ox.geometries_from_point((c.y, c.x), tags, dist=dist))
+            with osm_requests(self.osm_cache):
+                geom = ox.geometries_from_point((c.y, c.x), tags, dist=dist)
+            geom = to_crs(self.crs(), geom)
             self.__add_geometry(key, geom, **kwargs)
         return self
 
@@ -223,29 +363,78 @@ class Graph:
             Self: graph
         """
         if not key in self.geometries:
-            geom = to_crs(self.crs(),
-                    ox.geometries_from_polygon(self.extent(), tags))
+            with osm_requests(self.osm_cache):
+                geom = ox.geometries_from_polygon(self.extent(), tags)
+            geom = to_crs(self.crs(), geom)
             self.__add_geometry(key, geom, **kwargs)
         return self
     
+    def geometries_from_polygon(self, layers: dict[str, dict],
+            plot_args: Optional[dict[str, dict]]=None) -> Self:
+        """create geodataframes of several OSM entities with one query
+        over the extent of the graph
+
+        the tags of all layers are combined into one query and the
+        result is split into one geometry per layer (see `select_tags`),
+        like calling `geometry_from_polygon` for each layer
+
+        Args:
+            layers (dict[str, dict]): key -> tags of each geometry
+            plot_args (dict[str, dict], optional): key -> keyword args to
+                pass to plot functions
+
+        Returns:
+            Self: graph
+        """
+        return self.__add_layers(layers, plot_args,
+                lambda tags: ox.geometries_from_polygon(self.extent(), tags))
+
+    def geometries_from_point(self, layers: dict[str, dict], dist=1000,
+            plot_args: Optional[dict[str, dict]]=None) -> Self:
+        """create geodataframes of several OSM entities around the center
+        of the graph with one query, see `geometries_from_polygon`
+
+        Args:
+            layers (dict[str, dict]): key -> tags of each geometry
+            dist (int | float):  distance in meters
+            plot_args (dict[str, dict], optional): key -> keyword args to
+                pass to plot functions
+
+        Returns:
+            Self: graph
+        """
+        c = self.extent().centroid
+        return self.__add_layers(layers, plot_args,
+                lambda tags: ox.geometries_from_point((c.y, c.x), tags, dist=dist))
+
+    def __add_layers(self, layers: dict[str, dict],
+            plot_args: Optional[dict[str, dict]], download: Callable) -> Self:
+        """download the layers that are not in the geometries yet with one
+        query and add them
+        """
+        layers = {k: t for k, t in layers.items() if k not in self.geometries}
+        if layers:
+            with osm_requests(self.osm_cache):
+                data = download(combine_tags(layers))
+            data = to_crs(self.crs(), data)
+            for key, tags in layers.items():
+                self.__add_geometry(key, select_tags(data, tags),
+                        **(plot_args or {}).get(key, {}))
+        return self
+
     def make_cols_hashable(self):
         """make column of geodataframe hashable
 
-        Args:
-            data: specify whether "edge" or "node"
+        nodes and edges are normalized when they are created (see
+        `normalize_schema`), this only needs to be called after list
+        values are added to them
 
         Returns:
             None
         """
-        ncols = unhashable_cols(self.N)
-        if ncols:
-            for col in ncols:
-                self.N[col] = self.N[col].astype("string")
-            
-        ecols = unhashable_cols(self.E)
-        if ecols:
-            for col in ecols:
-                self.E[col] = self.E[col].astype("string")
+        for data in (self.N, self.E):
+            if data is not None:
+                normalize_schema(data)
         
     def routes_to_geodata(self, routes: list[list[Any]]):
         """given a of osmids:
@@ -253,13 +442,26 @@ class Graph:
             2. convert the point geometry of nodes to a routes (linestring)
             3. create a geodataframe from the geometry
             4. calculate the length of each route
+
+        all routes are gathered into one flat array of node ids with the
+        offsets of each route, so the coordinates and lengths are looked
+        up for every route at once
         """
-        route_nodes = [self.N.loc[route] for route in routes]
-        route_lines = [LineString(list(geo.geometry.values)) for geo in route_nodes]
-        route_geom = geopandas.GeoDataFrame(route_lines, geometry='geometry',
-                crs=self.crs(), columns=['geometry'])
-        route_geom['route_dist'] = route_geom.length
-        route_geom['osmids'] = [str(list(geo.index.values)) for geo in route_nodes]
+        if not routes:
+            # numpy.split of no offsets would still give one empty route
+            route_geom = geopandas.GeoDataFrame(
+                    geometry=geopandas.GeoSeries([]), crs=self.crs())
+            route_geom['route_dist'] = numpy.array([], dtype=float)
+            route_geom['osmids'] = numpy.array([], dtype=object)
+            return route_geom
+        flat, offsets = flatten(routes)
+        C = self.csr()
+        pos = C.index(flat)
+        x, y = C.x[pos], C.y[pos]
+        route_geom = geopandas.GeoDataFrame(
+                geometry=lines_from_xy(x, y, offsets), crs=self.crs())
+        route_geom['route_dist'] = path_lengths(x, y, offsets)
+        route_geom['osmids'] = numpy.split(flat, offsets[1:-1])
         return route_geom
         
     def shortest_path(self, origin: str, dest: str):
@@ -269,15 +471,39 @@ class Graph:
             origin : origin point
             dest   : destination point
 
+        searched on the compact graph, see `csr`
+
+        Returns:
+            list: node ids of the path
+
+        Raises:
+            nx.NetworkXNoPath: if dest can not be reached from origin
+        """
+        return paths_from_origin(self.csr(), origin, [dest])[0]
+
+    def shortest_paths(self, origin_ids: list[Any], dest_ids: list[Any],
+            workers: int=1, skip_missing: bool=False) -> list[list[Any]]:
+        """find the shortest path for each pair of origin/destination nodes
+
+        runs one search per unique origin instead of one per pair on the
+        compact graph, see `batched_shortest_paths` and `csr`
+
+        Args:
+            origin_ids (list): node ids of origins
+            dest_ids (list): node ids of destinations
+            workers (int, optional): number of processes. Defaults to 1.
+            skip_missing (bool, optional): give unreachable pairs a path of
+                None instead of raising nx.NetworkXNoPath
+
         Returns:
-            _type_: _description_
+            list[list]: node path of each pair, in the order of the pairs
         """
-        return nx.shortest_path(self.graph(), source=origin, target=dest,
-                                weight='length')
+        return batched_shortest_paths(self.csr(), origin_ids, dest_ids,
+                weight='length', workers=workers, skip_missing=skip_missing)
 
     # TODO(Joe-Degs): do the add_routes function on routes
     def shortest_path_with_route(self, route: Route, edge_kwargs={},
-            node_kwargs={}) -> Self:
+            node_kwargs={}, batched: bool=False, workers: int=1) -> Self:
         """add origin/dest points and get shortest path between points
 
         this route(s) can be plotted, used for shortest path analysis
@@ -286,22 +512,22 @@ class Graph:
         Args:
             route (Route): route of origin/destination point(s)
             kwargs: keyword args to pass to `plot` function
+            batched (bool): search once per unique origin, see `shortest_paths`
+            workers (int): number of processes for batched routing
         """
-        # reproject graph and route to same CRS
+        # project graph, route points are transformed to its CRS
         self.project().nodes_and_edges()
-        route.reproject(self.crs())
-        
-        # make all pandas objects hashable
-        self.make_cols_hashable()
 
         # extract nearest nodes and ids surrounding origin/dest points
-        origin_id = nearest_node_ids(self.graph(),
-            *lat_long_from_coords(coords_from_geodata(route.origin_geo)))
-        dest_id = nearest_node_ids(self.graph(),
-            *lat_long_from_coords(coords_from_geodata(route.dest_geo)))
+        origin_xy, dest_xy = route.xy(self.crs())
+        origin_id = self.snap(*origin_xy)[0].tolist()
+        dest_id = self.snap(*dest_xy)[0].tolist()
        
         # get the shortest path between each origin and destination point in route 
-        shortest_routes = list(map(self.shortest_path, origin_id, dest_id))
+        if batched:
+            shortest_routes = self.shortest_paths(origin_id, dest_id, workers)
+        else:
+            shortest_routes = list(map(self.shortest_path, origin_id, dest_id))
        
         # add shortest path geometries to the  graph object
         routes = self.routes_to_geodata(shortest_routes)
@@ -310,6 +536,96 @@ class Graph:
         self.__add_geometry('shortest_path_nodes', all_nodes, **node_kwargs)
         return self
 
+    def iter_routes(self, origin: str, dest: str, chunksize: int=100_000,
+            workers: int=1) -> Iterator[geopandas.GeoDataFrame]:
+        """route origin/destination pairs read from csv files in chunks
+
+        see `Route.stream`, every chunk is snapped and routed with
+        `shortest_paths` before the next one is read. Pairs without a path
+        between them are left out.
+
+        Args:
+            origin (str): csv file of origin x, y coordinates
+            dest (str): csv file of destination x, y coordinates
+            chunksize (int, optional): number of pairs routed at a time
+            workers (int, optional): number of processes for routing
+
+        Yields:
+            geopandas.GeoDataFrame: origin/dest ids and routes of a chunk
+        """
+        self.project(lazy=True)
+        for route in Route.stream(origin, dest, chunksize):
+            origin_xy, dest_xy = route.xy(self.crs())
+            origin_id = self.snap(*origin_xy)[0]
+            dest_id = self.snap(*dest_xy)[0]
+            paths = self.shortest_paths(origin_id.tolist(), dest_id.tolist(),
+                    workers, skip_missing=True)
+            found = numpy.array([p is not None for p in paths], dtype=bool)
+            routes = self.routes_to_geodata([p for p in paths if p is not None])
+            routes.insert(0, 'origin_id', origin_id[found])
+            routes.insert(1, 'dest_id', dest_id[found])
+            yield routes
+
+    def stream_routes(self, origin: str, dest: str, filepath: str,
+            chunksize: int=100_000, workers: int=1) -> int:
+        """route origin/destination csv files chunk by chunk and append
+        the routes of each chunk to a csv file
+
+        geometries are written as WKT and osmids separated by spaces, so
+        memory use depends on `chunksize` and not on the size of the files
+
+        Args:
+            origin (str): csv file of origin x, y coordinates
+            dest (str): csv file of destination x, y coordinates
+            filepath (str): csv file to write the routes to
+            chunksize (int, optional): number of pairs routed at a time
+            workers (int, optional): number of processes for routing
+
+        Returns:
+            int: number of routes written
+        """
+        count = 0
+        for i, routes in enumerate(self.iter_routes(origin, dest, chunksize,
+                workers)):
+            table = pandas.DataFrame(routes.drop(columns='geometry'))
+            table['osmids'] = [' '.join(map(str, ids)) for ids in routes.osmids]
+            table['geometry'] = routes.geometry.to_wkt().values
+            table.to_csv(filepath, mode='w' if i == 0 else 'a',
+                    header=i == 0, index=False)
+            count += len(table)
+        return count
+
+    def distance_matrix(self, route: Route, cutoff: Optional[float]=None,
+            long: bool=False, filepath: Optional[str]=None, workers: int=1):
+        """compute network distance between every origin and destination
+        of the route
+
+        Args:
+            route (Route): route of origin/destination point(s)
+            cutoff (float, optional): pairs further apart (in meters) are
+                not searched and get a distance of inf
+            long (bool, optional): return a long format table of the
+                reachable pairs instead of a dense matrix
+            filepath (str, optional): save long format table to parquet file
+            workers (int, optional): number of processes. Defaults to 1.
+
+        Returns:
+            numpy.ndarray | pandas.DataFrame: origins x destinations distances
+        """
+        self.project(lazy=True)
+        origin_xy, dest_xy = route.xy(self.crs())
+        origin_id = self.snap(*origin_xy)[0].tolist()
+        dest_id = self.snap(*dest_xy)[0].tolist()
+
+        matrix = distance_matrix(self.csr(), origin_id, dest_id,
+                weight='length', cutoff=cutoff, workers=workers)
+        if not long and filepath is None:
+            return matrix
+        table = distance_table(matrix, origin_id, dest_id)
+        if filepath is not None:
+            table.to_parquet(filepath, index=False)
+        return table if long else matrix
+
     def plot(self, graph: Optional[nx.MultiDiGraph]=None, **kwargs):
         """plot uses the osmnx.plot_graph method to do exploratory plot
         of the graph. It recieves an optional `graph` parameter to plot
@@ -331,7 +647,8 @@ class Graph:
     
     
     def static_plot(self, shortest_path=False, geom_keys: list=None, 
-                    node_kwargs: dict={}, edge_kwargs: dict={}, **kwargs):
+                    node_kwargs: dict={}, edge_kwargs: dict={}, fast=False,
+                    **kwargs):
         """generate a static plot of the street network graph
 
         see `PlotArgs` args on how arguments to plot functions are managed
@@ -341,6 +658,9 @@ class Graph:
             geom_keys (list[str])       : specify list of keys to geometries to plot
             node_kwargs (dict, optional): keyword arguments to plot nodes
             edge_kwargs (dict, optional): keyword arguments to plot edges
+            fast (bool, optional)       : draw the network straight from the
+                graph, decimated to the output resolution, and cache basemap
+                tiles on disk. see `render_network`
             kwargs: keyword arguments for plotting. see `PlotArgs` for more
 
         Returns:
@@ -350,13 +670,18 @@ class Graph:
         fig, ax = self.__get_fig_ax(args)
         # TODO: ax could be anything depending on nrows, ncols.. check that!
         
+        if fast:
+            render_network(self.graph(), ax, args['nodes'], args['edges'],
+                    args.points(alpha=None, **node_kwargs),
+                    args.lines(**edge_kwargs))
+
         # plot edges in network
-        if args['nodes']:
+        if args['nodes'] and not fast:
             self.nodes().N.plot(ax=ax,
                     **args.points(alpha=None, **node_kwargs))
         
         # plot the edges in graph / street network
-        if args['edges']:
+        if args['edges'] and not fast:
             self.edges().E.plot(ax=ax, **args.lines(**edge_kwargs))
         
         # plot the axis
@@ -369,6 +694,8 @@ class Graph:
         
         # add basemap
         if args['basemap'] and (crs := self.crs()) is not None:
+                if fast:
+                    tile_cache()
                 ctx.add_basemap(ax, crs=crs, **args.static())
                 
         if shortest_path:
@@ -0,0 +1,377 @@
+import argparse
+import json
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, \
+        as_completed
+from typing import Optional
+
+import matplotlib
+import networkx as nx
+import osmnx as ox
+import pandas
+from shapely.geometry import box
+from shapely.ops import unary_union
+
+from .cache import ResultCache, params_hash
+from .download import OSMCache, osm_requests, truncate_graph
+from .route import GeoPoint
+from .store import load_graph
+from .footprint import footprint_store
+from .utils import calc_bbox, download_center_distance, graph_indicators, \
+        black_bg_plot, visualize_edge_cc, visualize_edge_bc, \
+        visualize_node_bc, visualize_node_pr, visualize_street_footprint
+
+
+def area_name(place: str) -> str:
+    """file name of a study area, spaces are replaced with underscores"""
+    return '_'.join(place.split(' '))
+
+
+def area_graph_path(place: str, directory: str='data') -> str:
+    """path of the graphml file of a study area"""
+    return os.path.join(directory, f"{area_name(place)}.graphml")
+
+
+def area_indicators(job: tuple[str, str, bool | ResultCache]) -> pandas.Series:
+    """load a study area graph and calculate its indicators"""
+    path, name, cache = job
+    return pandas.Series(graph_indicators(load_graph(path), cache), name=name)
+
+
+def network_indicators(areas: str | GeoPoint='data/study_areas.csv',
+        directory: str='data', workers: Optional[int]=None,
+        filepath: Optional[str]=None, cache: bool | ResultCache=True) \
+        -> pandas.DataFrame:
+    """calculate the street network indicators of every study area
+
+    each area is processed in its own worker process, the result is a
+    wide table with one column per study area named `{city}-{place}`
+
+    Args:
+        areas (str | GeoPoint): study areas csv file with city and place columns
+        directory (str, optional): directory of the graphml files
+        workers (int, optional): number of processes, one per cpu if None
+        filepath (str, optional): csv file to save the table to
+        cache (bool | ResultCache, optional): reuse stored results, see `cached`
+
+    Returns:
+        pandas.DataFrame: indicator x study area table
+    """
+    if isinstance(areas, str):
+        areas = GeoPoint(areas)
+    data = areas.data
+    jobs = [(area_graph_path(place, directory), f"{city}-{place}", cache)
+            for city, place in zip(data.city, data.place)]
+
+    if workers == 1:
+        columns = list(map(area_indicators, jobs))
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            columns = list(pool.map(area_indicators, jobs))
+
+    df = pandas.concat(columns, axis=1)
+    if filepath is not None:
+        df.to_csv(filepath)
+    return df
+
+
+def read_manifest(directory: str) -> dict:
+    """read the manifest of a directory of graphml files or images, it
+    maps file names to the parameters and mtime they were last written with
+    """
+    try:
+        with open(os.path.join(directory, 'manifest.json')) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+
+def write_manifest(directory: str, manifest: dict):
+    path = os.path.join(directory, 'manifest.json')
+    with open(f"{path}.tmp", 'w') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(f"{path}.tmp", path)
+
+
+def is_current(path: str, params: dict, manifest: dict) -> bool:
+    """check if a graphml file was downloaded with params and not changed
+    since"""
+    entry = manifest.get(os.path.basename(path))
+    return os.path.isfile(path) and entry is not None \
+            and entry['params'] == params_hash(params) \
+            and entry['mtime'] == os.path.getmtime(path)
+
+
+def overlap_groups(boxes: list) -> list[list[int]]:
+    """group boxes that overlap directly or through other boxes
+
+    Returns:
+        list[list[int]]: positions of the boxes in each group
+    """
+    G = nx.Graph()
+    G.add_nodes_from(range(len(boxes)))
+    G.add_edges_from((i, j) for i in range(len(boxes))
+            for j in range(i + 1, len(boxes)) if boxes[i].intersects(boxes[j]))
+    return [sorted(c) for c in nx.connected_components(G)]
+
+
+def download_areas(areas: str | GeoPoint='data/study_areas.csv',
+        directory: str='data', area: int=700,
+        network_type: str='all_private', workers: int=4, force: bool=False,
+        merge: bool=True, osm_cache: bool | OSMCache=True) -> dict[str, str]:
+    """download and save the street network graph of every study area
+
+    areas are downloaded concurrently by a pool of `workers` threads.
+    Areas whose graphml file was already downloaded with the same
+    parameters are skipped, see `read_manifest`. Areas with overlapping
+    bboxes are downloaded with one request covering all of them and
+    each area is cut out of the shared graph.
+
+    Args:
+        areas (str | GeoPoint): study areas csv file with place, x and y columns
+        directory (str, optional): directory to save the graphml files to
+        area (int, optional): distance (in meters) from the center of an
+            area to the sides of its bbox, see `download_center_distance`
+        network_type (str, optional): osmnx network type
+        workers (int, optional): number of concurrent downloads
+        force (bool, optional): download areas that are up to date
+        merge (bool, optional): share requests between overlapping areas
+        osm_cache (bool | OSMCache, optional): see `osm_requests`
+
+    Returns:
+        dict[str, str]: 'downloaded' or 'skipped' for each graphml file
+    """
+    if isinstance(areas, str):
+        areas = GeoPoint(areas)
+    os.makedirs(directory, exist_ok=True)
+    manifest = read_manifest(directory)
+    lock = threading.Lock()
+
+    jobs, status = [], {}
+    for place, center in zip(areas.geodata.place, areas.geodata.geometry):
+        path = area_graph_path(place, directory)
+        params = dict(center=(round(center.y, 7), round(center.x, 7)),
+                area=area, network_type=network_type)
+        if not force and is_current(path, params, manifest):
+            status[path] = 'skipped'
+            continue
+        n, s, e, w = calc_bbox(center, area)
+        jobs.append((path, params, center, box(w, s, e, n)))
+
+    groups = overlap_groups([bbox for *_, bbox in jobs]) if merge \
+            else [[i] for i in range(len(jobs))]
+
+    def save(path: str, params: dict, G: nx.MultiDiGraph):
+        ox.save_graphml(G, filepath=path)
+        with lock:
+            manifest[os.path.basename(path)] = dict(
+                    params=params_hash(params), mtime=os.path.getmtime(path))
+            status[path] = 'downloaded'
+
+    def download(group: list[int]):
+        if len(group) == 1:
+            path, params, center, _ = jobs[group[0]]
+            save(path, params, download_center_distance(center, area,
+                    network_type=network_type))
+            return
+        shared = ox.graph_from_polygon(
+                unary_union([jobs[i][3] for i in group]),
+                network_type=network_type)
+        for i in group:
+            path, params, _, bbox = jobs[i]
+            G = truncate_graph(shared.copy(), bbox)
+            G = G.subgraph(max(nx.weakly_connected_components(G), key=len))
+            save(path, params, G.copy())
+
+    try:
+        with osm_requests(osm_cache), ThreadPoolExecutor(max_workers=workers) as pool:
+            list(pool.map(download, groups))
+    finally:
+        write_manifest(directory, manifest)
+    return status
+
+
+def download_main(argv: Optional[list[str]]=None):
+    parser = argparse.ArgumentParser(prog='python -m autogis download',
+            description='download street network graphs of study areas')
+    parser.add_argument('areas', nargs='?', default='data/study_areas.csv',
+            help='study areas csv file with city, place, x and y columns')
+    parser.add_argument('-d', '--directory', default='data',
+            help='directory to save the graphml files to')
+    parser.add_argument('-a', '--area', type=int, default=700,
+            help='distance in meters from the center to the sides of the bbox')
+    parser.add_argument('-n', '--network-type', default='all_private',
+            help='osmnx network type')
+    parser.add_argument('-j', '--workers', type=int, default=4,
+            help='number of concurrent downloads')
+    parser.add_argument('-f', '--force', action='store_true',
+            help='download areas that are up to date')
+    parser.add_argument('--no-merge', action='store_true',
+            help='download overlapping areas separately')
+    args = parser.parse_args(argv)
+    status = download_areas(args.areas, args.directory, args.area,
+            args.network_type, args.workers, args.force, not args.no_merge)
+    for path, state in status.items():
+        print(f"{state}: {path}")
+
+
+# plot kind -> function plotting the graph of a study area, footprints
+# are drawn from the path of the graph (see `visualize_street_footprint`)
+PLOT_KINDS = {
+    'edge_cc': visualize_edge_cc,
+    'bw': black_bg_plot,
+    'node_bc': visualize_node_bc,
+    'edge_bc': visualize_edge_bc,
+    'footprint': None,
+    'pagerank': visualize_node_pr,
+}
+
+
+def plot_path(city: str, place: str, kind: str, directory: str='images') -> str:
+    """path of the image of a plot kind of a study area"""
+    return os.path.join(directory, f"{city}_{area_name(place)}_{kind}.png")
+
+
+def plot_inputs(graph: str, kind: str) -> list[str]:
+    """files a plot of a study area is drawn from"""
+    inputs = [graph]
+    if kind == 'footprint':
+        buildings = footprint_store.path(os.path.splitext(graph)[0])
+        if os.path.isfile(buildings):
+            inputs.append(buildings)
+    return inputs
+
+
+def is_rendered(path: str, inputs: list[str], params: dict,
+        manifest: dict) -> bool:
+    """check if an image was rendered with params, not changed since and
+    is newer than the files it is drawn from"""
+    return is_current(path, params, manifest) and all(
+            os.path.getmtime(path) >= os.path.getmtime(i) for i in inputs)
+
+
+def _init_render_worker():
+    # render without a display
+    matplotlib.use('Agg', force=True)
+
+
+def render_plot(job: tuple[str, str, str, dict]) -> tuple[str, float]:
+    """plot a study area graph and save the image
+
+    Returns:
+        tuple[str, float]: path and mtime of the image
+    """
+    import matplotlib.pyplot as plt
+
+    kind, graph, path, params = job
+    if kind == 'footprint':
+        fig, _ = visualize_street_footprint(os.path.splitext(graph)[0])
+    else:
+        fig, _ = PLOT_KINDS[kind](load_graph(graph))
+    fig.suptitle(params['title'], fontsize=20)
+    fig.savefig(f"{path}.tmp.png", dpi=params['dpi'])
+    plt.close(fig)
+    os.replace(f"{path}.tmp.png", path)
+    return path, os.path.getmtime(path)
+
+
+def render_plots(areas: str | GeoPoint='data/study_areas.csv',
+        kinds: Optional[list[str]]=None, directory: str='data',
+        output: str='images', workers: Optional[int]=None, dpi: int=100,
+        force: bool=False) -> dict[str, str]:
+    """render plots of every study area in parallel, without a display
+
+    each image is rendered in a worker process using the Agg backend and
+    saved as `{output}/{city}_{place}_{kind}.png`. Images that are newer
+    than their graph (and building footprints) and were rendered with the
+    same parameters are skipped, see `read_manifest`.
+
+    Args:
+        areas (str | GeoPoint): study areas csv file with city and place columns
+        kinds (list[str], optional): plot kinds, all of `PLOT_KINDS` if None
+        directory (str, optional): directory of the graphml files
+        output (str, optional): directory to save the images to
+        workers (int, optional): number of processes, one per cpu if None
+        dpi (int, optional): resolution of the images
+        force (bool, optional): render images that are up to date
+
+    Returns:
+        dict[str, str]: 'rendered' or 'skipped' for each image
+    """
+    if isinstance(areas, str):
+        areas = GeoPoint(areas)
+    kinds = list(PLOT_KINDS) if kinds is None else kinds
+    unknown = set(kinds) - set(PLOT_KINDS)
+    if unknown:
+        raise ValueError(f"unknown plot kinds: {sorted(unknown)}")
+    os.makedirs(output, exist_ok=True)
+    manifest = read_manifest(output)
+
+    jobs, params, status = [], {}, {}
+    data = areas.data
+    for city, place in zip(data.city, data.place):
+        graph = area_graph_path(place, directory)
+        for kind in kinds:
+            path = plot_path(city, place, kind, output)
+            params[path] = dict(kind=kind, title=f"{place}, {city}", dpi=dpi)
+            if not force and is_rendered(path, plot_inputs(graph, kind),
+                    params[path], manifest):
+                status[path] = 'skipped'
+            else:
+                jobs.append((kind, graph, path, params[path]))
+
+    try:
+        with ProcessPoolExecutor(max_workers=workers,
+                initializer=_init_render_worker) as pool:
+            for future in as_completed([pool.submit(render_plot, job)
+                    for job in jobs]):
+                path, mtime = future.result()
+                manifest[os.path.basename(path)] = dict(
+                        params=params_hash(params[path]), mtime=mtime)
+                status[path] = 'rendered'
+    finally:
+        write_manifest(output, manifest)
+    return status
+
+
+def render_main(argv: Optional[list[str]]=None):
+    parser = argparse.ArgumentParser(prog='python -m autogis render',
+            description='render plots of the street networks of study areas')
+    parser.add_argument('areas', nargs='?', default='data/study_areas.csv',
+            help='study areas csv file with city, place, x and y columns')
+    parser.add_argument('-k', '--kinds', nargs='+', choices=list(PLOT_KINDS),
+            default=None, help='plot kinds to render, all by default')
+    parser.add_argument('-d', '--directory', default='data',
+            help='directory of the graphml files')
+    parser.add_argument('-o', '--output', default='images',
+            help='directory to save the images to')
+    parser.add_argument('-j', '--workers', type=int, default=None,
+            help='number of processes, one per cpu by default')
+    parser.add_argument('--dpi', type=int, default=100,
+            help='resolution of the images')
+    parser.add_argument('-f', '--force', action='store_true',
+            help='render images that are up to date')
+    args = parser.parse_args(argv)
+    status = render_plots(args.areas, args.kinds, args.directory, args.output,
+            args.workers, args.dpi, args.force)
+    for path, state in status.items():
+        print(f"{state}: {path}")
+
+
+def main(argv: Optional[list[str]]=None):
+    parser = argparse.ArgumentParser(prog='python -m autogis indicators',
+            description='calculate street network indicators of study areas')
+    parser.add_argument('areas', nargs='?', default='data/study_areas.csv',
+            help='study areas csv file with city, place, x and y columns')
+    parser.add_argument('-d', '--directory', default='data',
+            help='directory of the graphml files')
+    parser.add_argument('-o', '--output', default='data/network_indicators.csv',
+            help='csv file to write the indicators to')
+    parser.add_argument('-j', '--workers', type=int, default=None,
+            help='number of processes, one per cpu by default')
+    parser.add_argument('--no-cache', action='store_true',
+            help='recompute results instead of reusing stored ones')
+    args = parser.parse_args(argv)
+    network_indicators(args.areas, args.directory, args.workers, args.output,
+            cache=not args.no_cache)
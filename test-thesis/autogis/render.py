@@ -0,0 +1,191 @@
+import os
+from typing import Optional
+
+import numpy
+import networkx as nx
+import matplotlib.artist
+import matplotlib.axes
+from matplotlib.collections import LineCollection, PathCollection
+import contextily as ctx
+
+# directory contextily caches basemap tiles in, see `tile_cache`
+_tile_cache_dir: Optional[str] = None
+
+# PlotArgs line keyword args -> LineCollection keyword args
+_LINE_ARGS = {'color': 'colors', 'linewidth': 'linewidths',
+        'linestyle': 'linestyles'}
+
+# PlotArgs point keyword args -> scatter keyword args
+_POINT_ARGS = {'markersize': 's'}
+
+
+def tile_cache(directory: str='cache/tiles') -> str:
+    """make contextily cache basemap tiles in a directory, so they are
+    downloaded once and not on every plot"""
+    global _tile_cache_dir
+    if _tile_cache_dir != directory:
+        os.makedirs(directory, exist_ok=True)
+        ctx.set_cache_dir(directory)
+        _tile_cache_dir = directory
+    return directory
+
+
+def node_coords(G: nx.MultiDiGraph) -> numpy.ndarray:
+    """get the (n, 2) coordinates of the nodes of a graph"""
+    xy = numpy.empty((len(G), 2))
+    for i, (_, d) in enumerate(G.nodes(data=True)):
+        xy[i] = d['x'], d['y']
+    return xy
+
+
+def edge_segments(G: nx.MultiDiGraph) -> tuple[numpy.ndarray, numpy.ndarray]:
+    """get the straight segments making up the edges of a graph
+
+    edges without a geometry are one segment between their nodes, edges
+    with a geometry are split into the segments between its vertices
+
+    Returns:
+        tuple[numpy.ndarray, numpy.ndarray]: (k, 2) start and end
+            coordinates of the segments
+    """
+    pos = {node: i for i, node in enumerate(G.nodes)}
+    xy = node_coords(G)
+    edges = list(G.edges(data='geometry'))
+    straight = numpy.fromiter((g is None for _, _, g in edges), bool, len(edges))
+    src = numpy.fromiter((pos[u] for u, _, _ in edges), numpy.int64, len(edges))
+    dst = numpy.fromiter((pos[v] for _, v, _ in edges), numpy.int64, len(edges))
+    starts, ends = [xy[src[straight]]], [xy[dst[straight]]]
+
+    lines = [numpy.asarray(g.coords) for _, _, g in edges if g is not None]
+    if lines:
+        coords = numpy.concatenate(lines)
+        # segments between consecutive vertices of the same line
+        last = numpy.cumsum([len(line) for line in lines]) - 1
+        inner = numpy.ones(len(coords) - 1, dtype=bool)
+        inner[last[:-1]] = False
+        starts.append(coords[:-1][inner])
+        ends.append(coords[1:][inner])
+    return numpy.concatenate(starts), numpy.concatenate(ends)
+
+
+def decimate_segments(start: numpy.ndarray, end: numpy.ndarray,
+        tolerance: float) -> tuple[numpy.ndarray, numpy.ndarray]:
+    """keep one segment for each pair of pixels of size `tolerance`
+
+    segments are snapped to the pixel grid and segments joining the same
+    pixels (in either direction) are drawn once, so the number of
+    segments drawn is bounded by the resolution of the output and not
+    by the size of the network
+    """
+    if len(start) == 0:
+        return start, end
+    a = numpy.floor(start / tolerance).astype(numpy.int64)
+    b = numpy.floor(end / tolerance).astype(numpy.int64)
+    swap = (a[:, 0] > b[:, 0]) | ((a[:, 0] == b[:, 0]) & (a[:, 1] > b[:, 1]))
+    cells = numpy.where(swap[:, None], numpy.hstack([b, a]), numpy.hstack([a, b]))
+    _, first = numpy.unique(cells, axis=0, return_index=True)
+    first.sort()
+    return start[first], end[first]
+
+
+def segments_path(start: numpy.ndarray, end: numpy.ndarray) -> numpy.ndarray:
+    """join segments into one line broken by nan rows, which matplotlib
+    draws as a single path"""
+    path = numpy.full((3 * len(start), 2), numpy.nan)
+    path[0::3], path[1::3] = start, end
+    return path
+
+
+def decimate_points(xy: numpy.ndarray, tolerance: float) -> numpy.ndarray:
+    """keep one point per pixel of size `tolerance`"""
+    if len(xy) == 0:
+        return xy
+    cells = numpy.floor(xy / tolerance).astype(numpy.int64)
+    _, first = numpy.unique(cells, axis=0, return_index=True)
+    return xy[numpy.sort(first)]
+
+
+def pixel_size(ax: matplotlib.axes.Axes) -> float:
+    """size of a pixel of the axes in data units"""
+    (x0, x1), (y0, y1) = ax.get_xlim(), ax.get_ylim()
+    box = ax.get_window_extent()
+    return max(abs(x1 - x0) / max(box.width, 1), abs(y1 - y0) / max(box.height, 1))
+
+
+class NetworkDecimator(matplotlib.artist.Artist):
+    """decimates the edges and nodes drawn by `render_network` to the
+    pixel size of their axes when the axes are drawn, once the layout and
+    the dpi of the output are final
+    """
+
+    def __init__(self, segments: Optional[tuple[numpy.ndarray, numpy.ndarray]],
+            xy: numpy.ndarray, lines: Optional[LineCollection],
+            points: Optional[PathCollection]):
+        super().__init__()
+        # drawn before the collections it updates, without taking space
+        self.set_zorder(-numpy.inf)
+        self.set_in_layout(False)
+        self.segments, self.xy = segments, xy
+        self.lines, self.points = lines, points
+        self._tolerance: Optional[float] = None
+
+    def decimate(self, tolerance: float):
+        """update the collections to pixels of size `tolerance`"""
+        if tolerance == self._tolerance:
+            return
+        self._tolerance = tolerance
+        if self.lines is not None:
+            self.lines.set_segments([segments_path(
+                    *decimate_segments(*self.segments, tolerance))])
+        if self.points is not None:
+            self.points.set_offsets(decimate_points(self.xy, tolerance))
+
+    def draw(self, renderer):
+        self.decimate(pixel_size(self.axes))
+
+
+def render_network(G: nx.MultiDiGraph, ax: matplotlib.axes.Axes,
+        nodes: bool=True, edges: bool=True, node_kwargs: dict={},
+        edge_kwargs: dict={}) -> Optional[NetworkDecimator]:
+    """draw a street network as one line collection and one scatter
+
+    segments and nodes are decimated to the pixel size of the axes (see
+    `decimate_segments`) each time the axes are drawn, so drawing time
+    does not grow with the network
+
+    Args:
+        G (nx.MultiDiGraph): street network graph
+        ax (matplotlib.axes.Axes): axes to draw on
+        nodes (bool, optional): draw nodes
+        edges (bool, optional): draw edges
+        node_kwargs (dict, optional): `PlotArgs.points` keyword args
+        edge_kwargs (dict, optional): `PlotArgs.lines` keyword args
+
+    Returns:
+        NetworkDecimator: artist decimating the collections, None if the
+            graph is empty
+    """
+    xy = node_coords(G)
+    segments = edge_segments(G) if edges else None
+    # curved edges can reach past the outermost nodes
+    coords = [xy] + (list(segments) if segments is not None else [])
+    coords = numpy.concatenate(coords)
+    if len(coords) == 0:
+        return None
+    (minx, miny), (maxx, maxy) = coords.min(axis=0), coords.max(axis=0)
+    pad = 0.02 * max(maxx - minx, maxy - miny, 1e-9)
+    ax.set_xlim(minx - pad, maxx + pad)
+    ax.set_ylim(miny - pad, maxy + pad)
+    ax.set_aspect('equal')
+
+    lines = points = None
+    if edges:
+        lines = ax.add_collection(LineCollection([],
+                **{_LINE_ARGS.get(k, k): v for k, v in edge_kwargs.items()}))
+    if nodes:
+        # points are set when the axes are drawn
+        points = ax.scatter(numpy.empty(0), numpy.empty(0),
+                **{_POINT_ARGS.get(k, k): v for k, v in node_kwargs.items()})
+    decimator = NetworkDecimator(segments, xy, lines, points)
+    ax.add_artist(decimator)
+    return decimator
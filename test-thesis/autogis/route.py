@@ -1,11 +1,14 @@
 import random
+from itertools import zip_longest
 import folium
 import pandas
 import geopandas
 import networkx as nx
 import osmnx as ox
-from shapely.geometry import Polygon, Point
-from typing import Optional
+from shapely.geometry import Polygon
+from typing import Any, Iterator, Optional
+from typing_extensions import Self
+import numpy
 
 from .utils import *
 
@@ -16,6 +19,17 @@ class GeoPoint():
             self.data, geometry=geopandas.points_from_xy(self.data.x, self.data.y))
         
 
+    def reverse_geocode(self, geocoder=None) -> geopandas.GeoDataFrame:
+        """add the address of every point to the geodata
+
+        Args:
+            geocoder (optional): see `reverse_geocode`, cached network
+                geocoder if None
+        """
+        points = self.geodata.geometry.set_crs('EPSG:4326', allow_override=True)
+        self.geodata['address'] = reverse_geocode(points, geocoder).address.values
+        return self.geodata
+
     def explore(self, **kwargs) -> folium.Map:
         """generate an interactive map of geo coordinates
         
@@ -58,13 +72,14 @@ class Route():
     on a bigger graph
     """
     
-    def __init__(self, point_type, origin, dest):
+    def __init__(self, point_type, origin, dest, geocoder=None):
         """
         NB: [origin/destination] point can be a
                1. tupe[float, float] | list[tupe[float, float]] -> (lat, long)
                2. shapely.Point | list[shapely.Point]
                3. geocodable string | list[str]
                4. a csv file of x, y coordinates
+               5. a pandas.DataFrame with x, y columns
                
             coordinates are in the form (lat, long)
                 x -> long
@@ -77,6 +92,7 @@ class Route():
             values:
                 1. csv_coords (lat, long) points || csv_address {address(es) to geocode}
                 2. coords ([lat, long] values) || coords_list (list of [lat, long] values)
+                3. df_coords (DataFrames of x, y values)
                 2. address | sequence of addresses
             should be loaded
 
@@ -84,6 +100,10 @@ class Route():
             points of origin for shortest path analysis
         destination : str | tuple[float, float] | list[tuple[float, float]]
             destination points for shortest path analysis
+        geocoder : OfflineGeocoder | CachedGeocoder | bool | None
+            reverse geocoder to label the points with, the cached network
+            geocoder `default_geocoder()` is used if None. The points are
+            not geocoded (no address column) if False
         """
         
         self.origin:     Optional[pandas.DataFrame]       = None
@@ -93,6 +113,9 @@ class Route():
         self.origin_geo: Optional[geopandas.GeoDataFrame] = None
         self.dest_geo:   Optional[geopandas.GeoDataFrame] = None
         self.all_geo:    Optional[geopandas.GeoDataFrame] = None
+
+        # (crs, convex hull) of the points, see `extent`
+        self._extent: Optional[tuple[Any, Polygon]] = None
         
         typ = point_type.split('_')
         assert len(typ) >= 1, "Route: invalid point_type"
@@ -100,7 +123,9 @@ class Route():
             if origin is not None:
                 self.origin = pandas.read_csv(origin, sep=',')
             if dest is not None:
-                self.dest = pandas.read_csv(origin, sep=',')
+                self.dest = pandas.read_csv(dest, sep=',')
+        elif typ[0] == 'df':
+            self.origin, self.dest = origin, dest
         elif typ[0] == 'coords':
             
             # if coordinates is not list, convert to list
@@ -112,14 +137,17 @@ class Route():
             self.origin = pandas.DataFrame(origin, columns=['y', 'x'])
             self.dest = pandas.DataFrame(dest, columns=['y', 'x'])
         
-        # do the geocode
-        if 'coords' in point_type:
+        # do the geocode, without a geocoder the point geodata is only
+        # built when it is needed (see `points`)
+        if 'coords' in point_type and geocoder is False:
+            pass
+        elif 'coords' in point_type:
             if self.origin is not None:
                 self.origin_geo = reverse_geocode(
-                    coords_from_df(self.origin))
+                    coords_from_df(self.origin), geocoder)
             if self.dest is not None:
                 self.dest_geo = reverse_geocode(
-                    coords_from_df(self.dest))
+                    coords_from_df(self.dest), geocoder)
 
             # get shapely types of geometry column and assert they are
             # all point geometries
@@ -132,8 +160,69 @@ class Route():
             #TODO(Joe-Degs): add geocode from address functionality
                 pass
             
+    @classmethod
+    def stream(cls, origin: str, dest: str, chunksize: int=100_000,
+            geocoder=False) -> Iterator['Route']:
+        """read origin/destination csv files of x, y coordinates in chunks
+
+        row i of the origin file is paired with row i of the destination
+        file, only `chunksize` pairs are held in memory at a time
+
+        Args:
+            origin (str): csv file of origin points
+            dest (str): csv file of destination points
+            chunksize (int, optional): number of pairs in each route
+            geocoder (optional): see `Route`, points are not geocoded by default
+
+        Yields:
+            Route: route of the next chunk of pairs
+
+        Raises:
+            ValueError: if the files do not have the same number of rows,
+                raised at the first chunk where they differ
+        """
+        origins = pandas.read_csv(origin, sep=',', chunksize=chunksize)
+        dests = pandas.read_csv(dest, sep=',', chunksize=chunksize)
+        for o, d in zip_longest(origins, dests):
+            if o is None or d is None or len(o) != len(d):
+                raise ValueError(f"Route.stream: {origin} and {dest} do not "
+                        "have the same number of rows")
+            yield cls('df_coords', o.reset_index(drop=True),
+                    d.reset_index(drop=True), geocoder=geocoder)
+
+    def points(self) -> Self:
+        """build the point geodata of origin/dest points that were not
+        geocoded
+        """
+        if self.origin_geo is None and self.origin is not None:
+            self.origin_geo = points_geodata(self.origin)
+        if self.dest_geo is None and self.dest is not None:
+            self.dest_geo = points_geodata(self.dest)
+        return self
+
+    def xy(self, crs: Optional[CRS | str]=None) \
+            -> tuple[tuple[numpy.ndarray, numpy.ndarray], ...]:
+        """get origin/dest coordinates as x, y arrays
+
+        the arrays are taken from the x, y columns of the points and
+        transformed to `crs` in bulk, no geometries are built
+
+        Args:
+            crs (pyproj.CRS | str, optional): crs to transform the
+                coordinates to, EPSG:4326 if None
+
+        Returns:
+            tuple: (origin x, origin y), (dest x, dest y)
+        """
+        crs = crs or 'EPSG:4326'
+        empty = numpy.empty(0), numpy.empty(0)
+        return tuple(empty if df is None else
+                transform_xy(*xy_from_df(df), 'EPSG:4326', crs)
+                for df in (self.origin, self.dest))
+
     def to_crs(self, crs):
         "convert origin/destination geodata to new CRS"
+        self.points()
         self.origin_geo.to_crs(crs, inplace=True)
         self.dest_geo.to_crs(crs, inplace=True)
         return
@@ -150,7 +239,8 @@ class Route():
         """concatenate and return origin/destination geodata
         """
         if self.all_geo is None:
-            self.all_geo = self.origin_geo.append(self.dest_geo)
+            self.points()
+            self.all_geo = pandas.concat([self.origin_geo, self.dest_geo])
             self.all_geo.reset_index(inplace=True)
         return self.all_geo
 
@@ -165,14 +255,24 @@ class Route():
     def head_geo(self) -> tuple[geopandas.GeoDataFrame]:
         """return head of origin/dest geodataframe
         """
+        self.points()
         return self.origin_geo, self.dest_geo
     
     def extent(self) -> Polygon:
         """get a poygon specifying the extent of the route points
         it is buffered a little bit to contain important adjoining
         streets that might be cut off otherwise
+
+        it is the convex hull of the point coordinates in the crs of the
+        geodata, computed once per crs
         """
-        return self.geodata().unary_union.convex_hull
+        crs = self.origin_geo.crs if self.origin_geo is not None \
+                else 'EPSG:4326'
+        if self._extent is None or self._extent[0] != crs:
+            (x0, y0), (x1, y1) = self.xy(crs)
+            self._extent = (crs, convex_hull(numpy.concatenate([x0, x1]),
+                    numpy.concatenate([y0, y1])))
+        return self._extent[1]
     
     def graph_from_polygon(self, **kwargs) -> nx.MultiDiGraph:
         """download the street network graph of the area covering routes
@@ -196,6 +296,7 @@ class Route():
         Args:
             crs (pyproj.CRS | str): crs to project data to
         """
+        self.points()
         self.origin_geo = to_crs(crs, self.origin_geo)
         self.dest_geo = to_crs(crs, self.dest_geo)
         self.all_geo = to_crs(crs, self.geodata())
@@ -0,0 +1,263 @@
+from concurrent.futures import ProcessPoolExecutor
+from heapq import heappush, heappop
+from itertools import count
+from typing import Any, Hashable, Iterable, Optional
+
+import numpy
+import pandas
+import networkx as nx
+
+from .csr import CSRGraph
+
+# graph shared by the routing worker processes, set by `_init_worker`
+_worker_graph: Optional[nx.MultiDiGraph] = None
+_worker_weight: Optional[str] = None
+
+
+def edge_weight(keydict: dict, weight: Optional[str]) -> float:
+    """get the weight of the cheapest of the parallel edges between two nodes
+
+    Args:
+        keydict (dict): edge key -> edge attributes, as in `G.adj[u][v]`
+        weight (str | None): edge attribute to use, hop count if None
+    """
+    if weight is None:
+        return 1
+    return min(d.get(weight, 1) for d in keydict.values())
+
+
+def dijkstra(G: nx.MultiDiGraph, source: Hashable,
+        targets: Optional[Iterable[Hashable]]=None, weight: Optional[str]='length',
+        cutoff: Optional[float]=None, reverse: bool=False) -> tuple[dict, dict]:
+    """single source dijkstra search over a street network graph
+
+    the search stops as soon as every node in `targets` has been settled
+    and never expands nodes further than `cutoff` from the source. With
+    `reverse` edges are followed backwards, giving the distance from
+    every node to the source.
+
+    Args:
+        G (nx.MultiDiGraph | CSRGraph): street network graph
+        source: id of node to start search from
+        targets (Iterable, optional): stop once all of these are reached
+        weight (str, optional): edge attribute to minimize. Defaults to 'length'.
+        cutoff (float, optional): maximum distance to search
+        reverse (bool, optional): search along incoming edges, only
+            supported on networkx graphs
+
+    Returns:
+        tuple[dict, dict]: distance to and predecessor of each settled node
+    """
+    if isinstance(G, CSRGraph):
+        assert not reverse, "dijkstra: CSRGraph can only be searched forward"
+        return G.dijkstra(source, targets, cutoff=cutoff, weight=weight)
+    adj = G.pred if reverse else G.adj
+    remaining = None if targets is None else set(targets)
+    dist, pred, seen = {}, {source: None}, {source: 0}
+    c = count()
+    heap = [(0, next(c), source)]
+    while heap:
+        d, _, u = heappop(heap)
+        if u in dist:
+            continue
+        dist[u] = d
+        if remaining is not None:
+            remaining.discard(u)
+            if not remaining:
+                break
+        for v, keydict in adj[u].items():
+            vd = d + edge_weight(keydict, weight)
+            if cutoff is not None and vd > cutoff:
+                continue
+            if v not in seen or vd < seen[v]:
+                seen[v] = vd
+                pred[v] = u
+                heappush(heap, (vd, next(c), v))
+    return dist, pred
+
+
+def path_from_tree(dist: dict, pred: dict, target: Hashable) -> list[Any]:
+    """walk back the predecessors of a dijkstra search to get a path
+
+    Raises:
+        nx.NetworkXNoPath: if target was not reached by the search
+    """
+    if target not in dist:
+        raise nx.NetworkXNoPath(f"Target {target} cannot be reached from source.")
+    path = [target]
+    while (node := pred[path[-1]]) is not None:
+        path.append(node)
+    path.reverse()
+    return path
+
+
+def group_by_origin(origin_ids: list[Any], dest_ids: list[Any]) \
+        -> dict[Any, list[int]]:
+    """group origin/destination pairs by their origin
+
+    Returns:
+        dict[Any, list[int]]: origin id -> positions of its pairs
+    """
+    assert len(origin_ids) == len(dest_ids), \
+            "group_by_origin: expecting same number of origins and destinations"
+    groups = {}
+    for i, origin in enumerate(origin_ids):
+        groups.setdefault(origin, []).append(i)
+    return groups
+
+
+def paths_from_origin(G: nx.MultiDiGraph, origin: Any, dests: list[Any],
+        weight: Optional[str]='length', skip_missing: bool=False) \
+        -> list[Optional[list[Any]]]:
+    """find the shortest paths from one origin to many destinations with
+    a single dijkstra search
+
+    unreachable destinations raise nx.NetworkXNoPath, or get a path of
+    None with `skip_missing`
+    """
+    dist, pred = dijkstra(G, origin, dests, weight=weight)
+    if skip_missing:
+        return [path_from_tree(dist, pred, dest) if dest in dist else None
+                for dest in dests]
+    return [path_from_tree(dist, pred, dest) for dest in dests]
+
+
+def distances_from_origin(G: nx.MultiDiGraph, origin: Any, dests: list[Any],
+        weight: Optional[str]='length', cutoff: Optional[float]=None) \
+        -> numpy.ndarray:
+    """find the network distance from one origin to many destinations
+    with a single bounded dijkstra search
+
+    Returns:
+        numpy.ndarray: distance to each destination, inf if not reached
+    """
+    dist, _ = dijkstra(G, origin, dests, weight=weight, cutoff=cutoff)
+    return numpy.array([dist.get(dest, numpy.inf) for dest in dests],
+            dtype=float)
+
+
+def _init_worker(G: nx.MultiDiGraph, weight: Optional[str]):
+    global _worker_graph, _worker_weight
+    _worker_graph, _worker_weight = G, weight
+
+
+def _worker_paths(job: tuple[Any, list[Any], bool]) -> list[list[Any]]:
+    origin, dests, skip_missing = job
+    return paths_from_origin(_worker_graph, origin, dests, _worker_weight,
+            skip_missing)
+
+
+def _worker_distances(job: tuple[Any, list[Any], Optional[float]]) \
+        -> numpy.ndarray:
+    origin, dests, cutoff = job
+    return distances_from_origin(_worker_graph, origin, dests, _worker_weight,
+            cutoff)
+
+
+def batched_shortest_paths(G: nx.MultiDiGraph, origin_ids: list[Any],
+        dest_ids: list[Any], weight: Optional[str]='length', workers: int=1,
+        chunksize: int=16, skip_missing: bool=False) -> list[list[Any]]:
+    """find the shortest path for each origin/destination pair
+
+    pairs are grouped by origin so every unique origin runs one dijkstra
+    search for all of its destinations. The origin groups can be spread
+    across a pool of `workers` processes.
+
+    Args:
+        G (nx.MultiDiGraph | CSRGraph): street network graph
+        origin_ids (list): node id of each origin
+        dest_ids (list): node id of each destination
+        weight (str, optional): edge attribute to minimize. Defaults to 'length'.
+        workers (int, optional): number of processes. Defaults to 1.
+        chunksize (int, optional): origin groups sent to a worker at a time
+        skip_missing (bool, optional): give unreachable pairs a path of None
+            instead of raising nx.NetworkXNoPath
+
+    Returns:
+        list[list]: node path of each pair, in the order of the pairs
+    """
+    groups = group_by_origin(origin_ids, dest_ids)
+    jobs = [(origin, [dest_ids[i] for i in idx], skip_missing)
+            for origin, idx in groups.items()]
+
+    if workers > 1 and len(jobs) > 1:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                initargs=(G, weight)) as pool:
+            results = list(pool.map(_worker_paths, jobs, chunksize=chunksize))
+    else:
+        results = [paths_from_origin(G, origin, dests, weight, skip)
+                for origin, dests, skip in jobs]
+
+    routes = [None] * len(origin_ids)
+    for idx, paths in zip(groups.values(), results):
+        for i, path in zip(idx, paths):
+            routes[i] = path
+    return routes
+
+
+def distance_matrix(G: nx.MultiDiGraph, origin_ids: list[Any],
+        dest_ids: list[Any], weight: Optional[str]='length',
+        cutoff: Optional[float]=None, workers: int=1, chunksize: int=16) \
+        -> numpy.ndarray:
+    """compute the origins x destinations network distance matrix
+
+    runs one multi-target dijkstra search per unique origin. Searches
+    never expand nodes further than `cutoff`, pairs that are not reached
+    get a distance of inf.
+
+    Args:
+        G (nx.MultiDiGraph | CSRGraph): street network graph
+        origin_ids (list): node id of each origin (rows)
+        dest_ids (list): node id of each destination (columns)
+        weight (str, optional): edge attribute to minimize. Defaults to 'length'.
+        cutoff (float, optional): maximum distance to search
+        workers (int, optional): number of processes. Defaults to 1.
+        chunksize (int, optional): origins sent to a worker at a time
+
+    Returns:
+        numpy.ndarray: matrix of shape (len(origin_ids), len(dest_ids))
+    """
+    origins = list(dict.fromkeys(origin_ids))
+    dests = list(dest_ids)
+    jobs = [(origin, dests, cutoff) for origin in origins]
+
+    if workers > 1 and len(jobs) > 1:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                initargs=(G, weight)) as pool:
+            rows = list(pool.map(_worker_distances, jobs, chunksize=chunksize))
+    else:
+        rows = [distances_from_origin(G, origin, dests, weight, cutoff)
+                for origin in origins]
+
+    matrix = numpy.empty((len(origin_ids), len(dests)), dtype=float)
+    row_of = dict(zip(origins, rows))
+    for i, origin in enumerate(origin_ids):
+        matrix[i] = row_of[origin]
+    return matrix
+
+
+def distance_table(matrix: numpy.ndarray, origin_ids: list[Any],
+        dest_ids: list[Any], dropna: bool=True) -> pandas.DataFrame:
+    """convert a distance matrix to a long format table
+
+    Args:
+        matrix (numpy.ndarray): matrix from `distance_matrix`
+        origin_ids (list): node ids of the rows
+        dest_ids (list): node ids of the columns
+        dropna (bool, optional): drop pairs that were not reached
+
+    Returns:
+        pandas.DataFrame: columns origin, dest, origin_id, dest_id, distance
+    """
+    n, m = matrix.shape
+    table = pandas.DataFrame({
+        'origin': numpy.repeat(numpy.arange(n), m),
+        'dest': numpy.tile(numpy.arange(m), n),
+        'origin_id': numpy.repeat(numpy.asarray(origin_ids), m),
+        'dest_id': numpy.tile(numpy.asarray(dest_ids), n),
+        'distance': matrix.ravel(),
+    })
+    if dropna:
+        table = table[numpy.isfinite(table.distance.values)]
+        table.reset_index(drop=True, inplace=True)
+    return table
@@ -0,0 +1,87 @@
+import os
+import pickle
+from typing import Optional
+
+import numpy
+from scipy.spatial import cKDTree
+
+
+class NodeIndex:
+    """KD-tree over the coordinates of the nodes of a street network
+
+    it is built once per graph and used to snap large sets of points to
+    their nearest nodes. Distances are in the units of the coordinates,
+    so build it on a projected graph to snap by meters.
+    """
+
+    def __init__(self, ids: numpy.ndarray, x: numpy.ndarray, y: numpy.ndarray,
+            crs: Optional[str]=None):
+        """
+        Args:
+            ids (numpy.ndarray): node ids
+            x (numpy.ndarray): x coordinates of the nodes
+            y (numpy.ndarray): y coordinates of the nodes
+            crs (str, optional): crs of the coordinates
+        """
+        self.ids = numpy.asarray(ids)
+        self.crs = crs
+        self.tree = cKDTree(numpy.column_stack([x, y]))
+
+    @classmethod
+    def from_graph(cls, G) -> 'NodeIndex':
+        """build index over the nodes of a networkx graph"""
+        ids = numpy.array(list(G.nodes))
+        x = numpy.fromiter((d['x'] for _, d in G.nodes(data=True)), float, len(ids))
+        y = numpy.fromiter((d['y'] for _, d in G.nodes(data=True)), float, len(ids))
+        crs = G.graph.get('crs')
+        return cls(ids, x, y, None if crs is None else str(crs))
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def query(self, x, y, max_dist: Optional[float]=None,
+            chunksize: int=1_000_000) -> tuple[numpy.ndarray, numpy.ndarray]:
+        """snap points to their nearest nodes
+
+        points are queried `chunksize` at a time so millions of points can
+        be snapped without building one huge query array
+
+        Args:
+            x (array_like): x coordinates of the points
+            y (array_like): y coordinates of the points
+            max_dist (float, optional): points further than this from every
+                node are not snapped, they get id -1 and distance inf
+            chunksize (int, optional): number of points to query at a time
+
+        Returns:
+            tuple[numpy.ndarray, numpy.ndarray]: nearest node ids, distances
+        """
+        x, y = numpy.asarray(x, dtype=float), numpy.asarray(y, dtype=float)
+        n = len(x)
+        ids = numpy.empty(n, dtype=self.ids.dtype)
+        dist = numpy.empty(n, dtype=float)
+        bound = numpy.inf if max_dist is None else max_dist
+        for start in range(0, n, chunksize):
+            end = min(start + chunksize, n)
+            d, pos = self.tree.query(
+                    numpy.column_stack([x[start:end], y[start:end]]),
+                    distance_upper_bound=bound)
+            missed = pos == len(self.ids)
+            pos[missed] = 0
+            chunk = self.ids[pos]
+            if missed.any():
+                chunk[missed] = -1
+            ids[start:end], dist[start:end] = chunk, d
+        return ids, dist
+
+    def save(self, path: str):
+        """pickle the index to a file"""
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        with open(path, 'wb') as f:
+            pickle.dump(self, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+    @staticmethod
+    def load(path: str) -> 'NodeIndex':
+        """load index saved with `NodeIndex.save`"""
+        with open(path, 'rb') as f:
+            return pickle.load(f)
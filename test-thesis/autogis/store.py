@@ -0,0 +1,224 @@
+import json
+import os
+import shutil
+import tempfile
+import uuid
+from collections import OrderedDict
+from typing import Optional
+
+import numpy
+import networkx as nx
+import osmnx as ox
+from shapely import wkb
+from shapely.geometry.base import BaseGeometry
+
+from .csr import CSRGraph
+
+# number of graphs kept in memory by `load_graph`
+GRAPH_CACHE_SIZE = 8
+
+# (path, mtime) -> graph, least recently used first
+_graph_cache: OrderedDict = OrderedDict()
+
+
+def store_path(path: str) -> str:
+    """get the path of the binary store of a graphml file
+
+    `data/Adum.graphml` is stored in the directory `data/Adum.graph`
+    """
+    return f"{os.path.splitext(path)[0]}.graph"
+
+
+def store_is_current(path: str) -> bool:
+    """check if the binary store of a graphml file is newer than the file
+    """
+    # stores are moved into place complete, see `save_graph`
+    attrs = os.path.join(store_path(path), 'attrs.json')
+    return os.path.isfile(attrs) and \
+            os.path.getmtime(attrs) >= os.path.getmtime(path)
+
+
+def _columns(items: list[dict], skip: set) -> dict:
+    """turn a list of attribute dicts into columns, missing values are None"""
+    names = sorted({k for d in items for k in d if k not in skip})
+    return {name: [d.get(name) for d in items] for name in names}
+
+
+def _install(tmp: str, path: str):
+    """move a store written to `tmp` into `path`, replacing the store
+    there, if any. Directories can not be replaced by a single rename,
+    the old store is first renamed aside.
+    """
+    while True:
+        try:
+            os.rename(tmp, path)
+            return
+        except OSError:
+            if not os.path.isdir(path):
+                raise
+        old = f"{path}.old-{uuid.uuid4().hex}"
+        try:
+            os.rename(path, old)
+        except FileNotFoundError:
+            # moved aside by another process
+            continue
+        shutil.rmtree(old, ignore_errors=True)
+
+
+def save_graph(G: nx.MultiDiGraph, path: str, source: Optional[str]=None):
+    """save a graph to a binary store
+
+    the store is a directory with the arrays of a `CSRGraph` as .npy
+    files, edge geometries as WKB and the remaining node/edge attributes
+    as json columns. It is written to a temporary directory next to
+    `path` and moved into place once complete, so processes loading the
+    same graph never read a partly written store.
+
+    Args:
+        G (nx.MultiDiGraph): street network graph
+        path (str): directory to save to
+        source (str, optional): graphml file the graph was read from, if
+            another process stored it in the meantime its store is kept
+    """
+    parent = os.path.dirname(os.path.abspath(path))
+    os.makedirs(parent, exist_ok=True)
+    tmp = tempfile.mkdtemp(prefix=f"{os.path.basename(path)}.tmp-", dir=parent)
+    try:
+        _write_graph(G, tmp)
+        if source is not None and store_is_current(source):
+            shutil.rmtree(tmp)
+        else:
+            _install(tmp, path)
+    except BaseException:
+        shutil.rmtree(tmp, ignore_errors=True)
+        raise
+
+
+def _write_graph(G: nx.MultiDiGraph, path: str):
+    """write the files of a binary store, see `save_graph`"""
+    C = CSRGraph.from_graph(G)
+    C.save(path)
+
+    nodes = [d for _, d in G.nodes(data=True)]
+    edges = [d for u in G for keydict in G.adj[u].values()
+            for d in keydict.values()]
+
+    geoms = [d.get('geometry') for d in edges]
+    blobs = [wkb.dumps(g) if isinstance(g, BaseGeometry) else b'' for g in geoms]
+    offsets = numpy.cumsum([0] + [len(b) for b in blobs], dtype=numpy.int64)
+    numpy.save(os.path.join(path, 'geometry.npy'),
+            numpy.frombuffer(b''.join(blobs), dtype=numpy.uint8))
+    numpy.save(os.path.join(path, 'geometry_ptr.npy'), offsets)
+
+    with open(os.path.join(path, 'attrs.json'), 'w') as f:
+        json.dump({
+            'graph': G.graph,
+            'nodes': _columns(nodes, {'x', 'y'}),
+            'edges': _columns(edges, {'length', 'osmid', 'geometry'}),
+        }, f, default=str)
+
+
+def read_graph(path: str, mmap: bool=True) -> nx.MultiDiGraph:
+    """read a graph from a binary store written by `save_graph`
+
+    Args:
+        path (str): directory of the store
+        mmap (bool, optional): memory-map the arrays. Defaults to True.
+    """
+    C = CSRGraph.load(path, mmap=mmap)
+    geom = numpy.load(os.path.join(path, 'geometry.npy'),
+            mmap_mode='r' if mmap else None)
+    geom_ptr = numpy.load(os.path.join(path, 'geometry_ptr.npy'))
+    with open(os.path.join(path, 'attrs.json')) as f:
+        attrs = json.load(f)
+
+    ids = C.ids.tolist()
+    G = nx.MultiDiGraph(**attrs['graph'])
+
+    node_cols = attrs['nodes']
+    node_data = [{'x': x, 'y': y} for x, y in zip(C.x.tolist(), C.y.tolist())]
+    for name, values in node_cols.items():
+        for d, val in zip(node_data, values):
+            if val is not None:
+                d[name] = val
+    G.add_nodes_from(zip(ids, node_data))
+
+    sources = numpy.repeat(C.ids, numpy.diff(C.indptr)).tolist()
+    targets = C.ids[C.indices].tolist()
+    osmid_ptr = C.osmid_ptr.tolist()
+    osmid = C.osmid.tolist()
+    edge_data = []
+    for j, length in enumerate(C.length.tolist()):
+        osmids = osmid[osmid_ptr[j]:osmid_ptr[j + 1]]
+        d = {'length': length}
+        if osmids:
+            d['osmid'] = osmids[0] if len(osmids) == 1 else osmids
+        if geom_ptr[j + 1] > geom_ptr[j]:
+            d['geometry'] = wkb.loads(bytes(geom[geom_ptr[j]:geom_ptr[j + 1]]))
+        edge_data.append(d)
+    for name, values in attrs['edges'].items():
+        for d, val in zip(edge_data, values):
+            if val is not None:
+                d[name] = val
+    G.add_edges_from(zip(sources, targets, C.key.tolist(), edge_data))
+    return G
+
+
+def load_graph(path: str, copy: bool=True) -> nx.MultiDiGraph:
+    """load a graphml file through its binary store
+
+    the graphml file is parsed once and written to a binary store next to
+    it (see `store_path`), later loads read the store instead. The last
+    `GRAPH_CACHE_SIZE` loaded graphs are kept in memory.
+
+    callers get a copy of the graph kept in memory, so changes to it do
+    not leak into later loads. Read only callers can pass copy=False to
+    share it
+
+    Args:
+        path (str): path to graphml file or binary store
+        copy (bool, optional): return a copy of the shared graph.
+            Defaults to True.
+
+    Returns:
+        nx.MultiDiGraph: street network graph
+    """
+    key = (os.path.abspath(path), os.path.getmtime(path))
+    if key in _graph_cache:
+        _graph_cache.move_to_end(key)
+        G = _graph_cache[key]
+        return G.copy() if copy else G
+
+    if os.path.isdir(path):
+        G = read_graph(path)
+    else:
+        store = store_path(path)
+        if store_is_current(path):
+            G = read_graph(store)
+        else:
+            G = ox.load_graphml(path)
+            save_graph(G, store, source=path)
+
+    _graph_cache[key] = G
+    while len(_graph_cache) > GRAPH_CACHE_SIZE:
+        _graph_cache.popitem(last=False)
+    return G.copy() if copy else G
+
+
+def load_csr(path: str) -> CSRGraph:
+    """load the compact graph of a graphml file from its binary store,
+    memory mapped
+
+    Args:
+        path (str): path to graphml file or binary store
+    """
+    if os.path.isdir(path):
+        return CSRGraph.load(path, mmap=True)
+    if not store_is_current(path):
+        load_graph(path, copy=False)
+    return CSRGraph.load(store_path(path), mmap=True)
+
+
+def clear_graph_cache():
+    """drop the graphs kept in memory by `load_graph`"""
+    _graph_cache.clear()
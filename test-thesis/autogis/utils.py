@@ -1,5 +1,9 @@
 import os
-from typing import Sequence
+from functools import lru_cache
+from itertools import chain
+from typing import Any, Optional, Sequence
+import numpy
+import shapely
 import geopandas
 import pandas
 
@@ -7,10 +11,19 @@ import matplotlib.colors as colors
 import matplotlib.pyplot as plt
 import matplotlib.cm as cm
 import contextily as ctx
-from pyproj import CRS
+from scipy.spatial import ConvexHull
+from pyproj import CRS, Transformer
 import osmnx as ox
 import networkx as nx
-from shapely.geometry import Point
+from shapely.geometry import Point, LineString, MultiPoint, Polygon, box
+
+from .csr import CSRGraph
+from .centrality import *
+from .cache import *
+from .store import *
+from .geocode import *
+from .download import *
+from .footprint import *
 
 def load_csv(sep: str, *files: str, **kwargs) -> list[pandas.DataFrame]:
     """load csv file from filesystem"""
@@ -46,26 +59,121 @@ def calc_bbox(center: tuple|Point, distance: int):
     lon_min = lon - off 
     return lat_max, lat_min, lon_max, lon_min
 
-def get_graph_area(G: nx.MultiDiGraph):
+def get_graph_area(G: nx.MultiDiGraph) -> float:
     """return area of graph in meters
 
+    it is the area of the convex hull of the nodes, only the vertices of
+    the hull are projected (to the UTM zone of the graph) if the graph
+    is not projected
+
+    Args:
+        G (nx.MultiDiGraph): street network graph
+
+    Returns:
+        float: area in square meters
+    """
+    return graph_extent(G, crs=None if is_projected(G) else graph_utm_crs(G)).area
+
+def node_xy(G: nx.MultiDiGraph) -> tuple[numpy.ndarray, numpy.ndarray]:
+    """get the coordinates of the nodes of a graph as float arrays"""
+    x = numpy.fromiter((d['x'] for _, d in G.nodes(data=True)), float, len(G))
+    y = numpy.fromiter((d['y'] for _, d in G.nodes(data=True)), float, len(G))
+    return x, y
+
+def is_projected(G: nx.MultiDiGraph) -> bool:
+    """check if the crs of a graph is projected"""
+    return CRS.from_user_input(G.graph['crs']).is_projected
+
+@lru_cache(maxsize=None)
+def utm_crs(zone: int, south: bool=False) -> CRS:
+    """get (cached) crs of a UTM zone"""
+    return CRS.from_proj4(f"+proj=utm +zone={zone}{' +south' if south else ''} "
+            "+ellps=WGS84 +datum=WGS84 +units=m +no_defs")
+
+def utm_crs_of(x: numpy.ndarray, y: numpy.ndarray) -> CRS:
+    """get crs of the UTM zone of the center of lat/long coordinates, like
+    osmnx does when projecting"""
+    lon, lat = float(numpy.mean(x)), float(numpy.mean(y))
+    return utm_crs(int((lon + 180) // 6) + 1, lat < 0)
+
+def graph_utm_crs(G: nx.MultiDiGraph) -> CRS:
+    """get crs of the UTM zone of an unprojected graph"""
+    return utm_crs_of(*node_xy(G))
+
+def graph_extent(G: nx.MultiDiGraph, crs: Optional[CRS | str]=None) -> Polygon:
+    """get the convex hull of the nodes of a graph
+
     Args:
-        G (nx.MultiDiGraph): _description_
+        G (nx.MultiDiGraph): street network graph
+        crs (pyproj.CRS | str, optional): crs to transform the hull to,
+            only its vertices are transformed
 
     Returns:
-        _type_: _description_
+        Polygon: convex hull in the crs of the graph or `crs`
     """
-    nodes = ox.graph_to_gdfs(ox.project_graph(G), edges=False)
-    return nodes.unary_union.convex_hull.area
+    hull = convex_hull(*node_xy(G))
+    if crs is None or not isinstance(hull, Polygon):
+        return hull
+    x, y = transform_xy(*hull.exterior.xy, G.graph['crs'], crs)
+    return Polygon(numpy.column_stack([x, y]))
+
+def project_graph_xy(G: nx.MultiDiGraph, to_crs: Optional[CRS | str]=None) \
+        -> nx.MultiDiGraph:
+    """project a graph by transforming its node coordinates as arrays
+
+    the original coordinates are kept as lon/lat like osmnx does. Edge
+    geometries are not projected, their crs is kept in the graph
+    attribute `geometry_crs` until `project_edge_geometry` is called.
 
-def download_center_distance(center: tuple|Point, area: int, network_type: str = 'drive') -> nx.MultiDiGraph:
+    Args:
+        G (nx.MultiDiGraph): unprojected street network graph
+        to_crs (pyproj.CRS | str, optional): crs to project to, the UTM
+            zone of the graph if None
+
+    Returns:
+        nx.MultiDiGraph: projected copy of the graph
+    """
+    x, y = node_xy(G)
+    crs = CRS.from_user_input(to_crs) if to_crs is not None else utm_crs_of(x, y)
+    px, py = transform_xy(x, y, G.graph['crs'], crs)
+    P = G.copy()
+    for (_, d), *xy in zip(P.nodes(data=True), px.tolist(), py.tolist(),
+            x.tolist(), y.tolist()):
+        d.update(zip(('x', 'y', 'lon', 'lat'), xy))
+    P.graph['geometry_crs'] = G.graph['crs']
+    P.graph['crs'] = crs
+    return P
+
+def project_edge_geometry(G: nx.MultiDiGraph) -> nx.MultiDiGraph:
+    """project the edge geometries of a graph projected with
+    `project_graph_xy`, in place, all geometries are projected at once
+    """
+    from_crs = G.graph.pop('geometry_crs', None)
+    if from_crs is None:
+        return G
+    edges = [d for _, _, d in G.edges(data=True) if 'geometry' in d]
+    if edges:
+        geoms = geopandas.GeoSeries([d['geometry'] for d in edges],
+                crs=from_crs).to_crs(G.graph['crs'])
+        for d, geom in zip(edges, geoms):
+            d['geometry'] = geom
+    return G
+
+def download_center_distance(center: tuple|Point, area: int, network_type: str = 'drive',
+        tile_size: float=None, workers: int=4) -> nx.MultiDiGraph:
     """download street network graph of given point with rectangular bbox
     
     Args:
         center (tuple | Point): a tuple of (lat, long) coordinates or a shapely point
         area (int): distance(in meters) from point to construct center point
+        tile_size (float, optional): download in tiles of this size (in
+            degrees) for large areas, see `tiled_graph`
+        workers (int, optional): number of concurrent tile downloads
     """
     n, s, e, w = calc_bbox(center, area)
+    if tile_size is not None:
+        return tiled_graph(box(w, s, e, n), tile_size, workers,
+                network_type=network_type)
     return ox.graph_from_bbox(n, s, e, w, network_type=network_type)
 
 def black_bg_plot(G: nx.MultiDiGraph, **kwargs):
@@ -85,16 +193,32 @@ def black_bg_plot(G: nx.MultiDiGraph, **kwargs):
         show=False,
         **kwargs)
     
-def visualize_edge_cc(G: nx.MultiDiGraph, **kwargs):
+def sampled_cache(k: Optional[int], seed: Optional[int],
+        cache: bool | ResultCache) -> bool | ResultCache:
+    """result cache to use for a centrality estimated from k sampled
+    sources, sampling without a seed gives a different result every
+    time so it is not cached
+    """
+    return False if k is not None and seed is None else cache
+
+def visualize_edge_cc(G: nx.MultiDiGraph, weight: str=None, workers: int=1,
+        cache: bool | ResultCache=True, **kwargs):
     """calculate and plot centrality for each street in the graph
     the color map depicts the most central streets in bright yellow
     and least central in dark purple
+
+    Args:
+        G (nx.MultiDiGraph): street network graph
+        weight (str, optional): use edge lengths with 'length', see `edge_closeness`
+        workers (int, optional): number of processes to compute with
+        cache (bool | ResultCache, optional): reuse stored results, see `cached`
     
     Returns:
         fig, ax: matplotib figure and axes objects
     """
-    edge_centrality = nx.closeness_centrality(nx.line_graph(G))
-    ev = [edge_centrality[edge + (0,)] for edge in G.edges()]
+    edge_centrality = cached(G, 'edge_closeness', dict(weight=weight),
+            lambda: edge_closeness(G, weight=weight, workers=workers), cache)
+    ev = [edge_centrality[edge] for edge in G.edges(keys=True)]
     norm = colors.Normalize(vmin=min(ev)*0.8, vmax=max(ev))
     cmap = cm.ScalarMappable(norm=norm, cmap=cm.inferno)
     ec = [cmap.to_rgba(cl) for cl in ev]
@@ -109,23 +233,31 @@ def visualize_edge_cc(G: nx.MultiDiGraph, **kwargs):
         show=False,
         **kwargs)
 
-def visualize_edge_bc(G: nx.MultiDiGraph, **kwargs):
+def visualize_edge_bc(G: nx.MultiDiGraph, k: int=None, seed: int=None,
+        workers: int=1, cache: bool | ResultCache=True, **kwargs):
     """visualize the betweenness centrality of street segments
 
     the color map depicts the most central streets in bright yellow
     and least central in dark purple
+
+    Args:
+        G (nx.MultiDiGraph): street network graph
+        k (int, optional): estimate from k sampled sources, see `edge_betweenness`
+        seed (int, optional): seed for sampling the sources
+        workers (int, optional): number of processes to compute with
+        cache (bool | ResultCache, optional): reuse stored results, see
+            `cached`. Unseeded samples are not cached
     
     returns:
         fig, ax: matplotib figure and axes objects
     """
-    bc = nx.edge_betweenness(G, normalized=True)
-    ev = [i[0] + (0,) for i in bc.items()]
-    for i, j in zip(ev, bc.keys()):
-        bc[i] = bc[j]
-        del bc[j]
-    norm = colors.Normalize(vmin=min(bc.values())*0.8, vmax=max(bc.values()))
+    bc = cached(G, 'edge_betweenness', dict(normalized=True, k=k, seed=seed),
+            lambda: edge_betweenness(G, normalized=True, k=k, seed=seed,
+                workers=workers), sampled_cache(k, seed, cache))
+    ev = [bc[edge] for edge in G.edges(keys=True)]
+    norm = colors.Normalize(vmin=min(ev)*0.8, vmax=max(ev))
     cmap = cm.ScalarMappable(norm=norm, cmap=cm.inferno)
-    ec = [cmap.to_rgba(cl) for cl in bc.values()]
+    ec = [cmap.to_rgba(cl) for cl in ev]
     return ox.plot_graph(
         G,
         bgcolor='white',
@@ -143,37 +275,44 @@ def clean_heights(x):
     except ValueError:
         return 0
 
-def building_footprint_from_graph(path: str, dist=700):
+def building_footprint_from_graph(path: str, dist=700,
+        G: Optional[nx.MultiDiGraph]=None,
+        store: Optional[FootprintStore]=None) -> geopandas.GeoDataFrame:
     """given the path to the graph, download and save the building footprint of
     the graph
+
+    footprints are kept in a `FootprintStore`, they are downloaded once
+    around the center of the graph
+
+    Args:
+        path (str): path of the graphml file without extension
+        dist (int, optional): distance in meters around the center
+        G (nx.MultiDiGraph, optional): the graph if it is already loaded,
+            it must not be projected
+        store (FootprintStore, optional): `footprint_store` if None
+
+    Returns:
+        geopandas.GeoDataFrame: projected building polygons
     """
-    G = ox.load_graphml(f"{path}.graphml")
-    nodes = ox.graph_to_gdfs(ox.project_graph(G), edges=False)
-    center = nodes.unary_union.convex_hull.centroid
-    lat, lng = center.y, center.x
-    print(lat, lng)
-    gdf = None
-    file = f"{path}.geojson"
-    if not os.path.exists(file):
-        gdf = ox.geometries_from_point((lat,lng), dist=dist, tags={'building': True})
-        gdf.to_file(file, driver="GeoJSON")
-    else:
-        gdf = geopandas.read_file(file)
-    buildings = ox.projection.project_gdf(gdf)
-    buildings = buildings[buildings.geom_type.isin(['Polygon', 'MultiPolygon'])]
-    buildings['height'] = buildings['height'].fillna(0).apply(clean_heights)
-    buildings = buildings.reset_index().explode()
+    store = store or footprint_store
+    if not os.path.isfile(store.path(path)):
+        G = G if G is not None else load_graph(f"{path}.graphml", copy=False)
+        x, y = (numpy.fromiter((d[c] for _, d in G.nodes(data=True)), float,
+                len(G)) for c in ('x', 'y'))
+        center = convex_hull(x, y).centroid
+        store.fetch(path, (center.y, center.x), dist)
+    buildings = ox.projection.project_gdf(store.load(path))
+    buildings = buildings.explode(index_parts=False)
     buildings.reset_index(inplace=True, drop=True)
     return buildings
 
 def visualize_street_footprint(path: str, **kwargs):
     """visualize the building footprints of study area
     """
-    G = ox.load_graphml(f"{path}.graphml")
-    G = ox.projection.project_graph(G)
-    edges = ox.graph_to_gdfs(G, nodes=False, edges=True, node_geometry=False,
-            fill_edge_geometry=True)
-    buildings = building_footprint_from_graph(path)
+    G = load_graph(f"{path}.graphml", copy=False)
+    buildings = building_footprint_from_graph(path, G=G)
+    edges = ox.graph_to_gdfs(ox.projection.project_graph(G), nodes=False,
+            edges=True, node_geometry=False, fill_edge_geometry=True)
     fig, ax = plt.subplots(1, 1, figsize=(10, 10))
     buildings.plot(ax=ax, color='darkgrey')
     edges.plot(ax=ax)
@@ -207,17 +346,25 @@ def visualize_node_length(G: nx.MultiDiGraph, **kwargs):
         show=False,
         **kwargs)
 
-def visualize_node_bc(G: nx.MultiDiGraph, **kwargs):
+def visualize_node_bc(G: nx.MultiDiGraph, k: int=None, seed: int=None,
+        workers: int=1, cache: bool | ResultCache=True, **kwargs):
     """calculate and plot betweeness centrality of nodes on the directed graph
     of the downloaded multigraph 
 
     Args:
         G (nx.MultiDiGraph): street network downloaded and constructed by osmnx
+        k (int, optional): estimate from k sampled sources, see `node_betweenness`
+        seed (int, optional): seed for sampling the sources
+        workers (int, optional): number of processes to compute with
+        cache (bool | ResultCache, optional): reuse stored results, see
+            `cached`. Unseeded samples are not cached
     
     Returns:
         fig, ax: matplotib figure and axes objects
     """
-    bc = nx.betweenness_centrality(ox.get_digraph(G), weight='length')
+    bc = cached(G, 'node_betweenness', dict(weight='length', k=k, seed=seed),
+            lambda: node_betweenness(G, weight='length', k=k, seed=seed,
+                workers=workers), sampled_cache(k, seed, cache))
     nx.set_node_attributes(G, bc, 'bc')
     nc = ox.plot.get_node_colors_by_attr(G, 'bc', cmap='inferno')
     return ox.plot_graph(
@@ -232,22 +379,97 @@ def visualize_node_bc(G: nx.MultiDiGraph, **kwargs):
         show=False,
         **kwargs)
 
-def reverse_geocode(coords: list[Point]) -> geopandas.GeoDataFrame:
+def visualize_node_pr(G: nx.MultiDiGraph, cache: bool | ResultCache=True,
+        **kwargs):
+    """calculate and plot pagerank of nodes on the directed graph of the
+    downloaded multigraph
+
+    Args:
+        G (nx.MultiDiGraph): street network downloaded and constructed by osmnx
+        cache (bool | ResultCache, optional): reuse stored results, see `cached`
+    
+    Returns:
+        fig, ax: matplotib figure and axes objects
+    """
+    pr = cached(G, 'pagerank', dict(weight='length'),
+            lambda: nx.pagerank(ox.get_digraph(G), weight='length'), cache)
+    nx.set_node_attributes(G, pr, 'pr')
+    nc = ox.plot.get_node_colors_by_attr(G, 'pr', cmap='inferno')
+    return ox.plot_graph(
+        G,
+        figsize=(10, 10),
+        bgcolor='white',
+        node_color=nc,
+        node_size=50,
+        node_zorder=2,
+        edge_color='black',
+        edge_linewidth=0.3,
+        show=False,
+        **kwargs)
+
+def graph_indicators(G: nx.MultiDiGraph, cache: bool | ResultCache=True) -> dict:
+    """calculate the street network indicators of a graph
+
+    these are the osmnx basic stats (with street per node counts and
+    proportions flattened to `{k}way_count`/`{k}way_proportion`) and the
+    non-dict values of the osmnx extended stats
+
+    Args:
+        G (nx.MultiDiGraph): unprojected street network graph
+        cache (bool | ResultCache, optional): reuse stored results, see `cached`
+
+    Returns:
+        dict: indicator name -> value
+    """
+    def basic():
+        # the projected graph is shared by the area and the stats
+        projected = ox.project_graph(G, to_crs=graph_utm_crs(G))
+        bstats = ox.basic_stats(projected, area=get_graph_area(projected),
+                clean_intersects=True, circuity_dist='euclidean')
+        for k, count in bstats.pop('streets_per_node_counts').items():
+            bstats[f"{k}way_count"] = count
+        for k, prop in bstats.pop('streets_per_node_proportions').items():
+            bstats[f"{k}way_proportion"] = prop
+        return bstats
+
+    def extended():
+        estats = ox.extended_stats(G, ecc=True, bc=True, cc=True)
+        return {k: v for k, v in estats.items() if type(v) is not dict}
+
+    bstats = cached(G, 'basic_stats', dict(clean_intersects=True,
+            circuity_dist='euclidean'), basic, cache)
+    estats = cached(G, 'extended_stats', dict(ecc=True, bc=True, cc=True),
+            extended, cache)
+    return bstats | estats
+
+def reverse_geocode(coords: list[Point], geocoder=None) -> geopandas.GeoDataFrame:
     """reverse geocode list of shapely points
 
+    Args:
+        coords (list[Point]): lat/long points
+        geocoder (optional): object with a `reverse(points)` method such as
+            `OfflineGeocoder` or `CachedGeocoder`, `default_geocoder()` if None
     """
-    return geopandas.tools.reverse_geocode(coords)
+    return (geocoder or default_geocoder()).reverse(coords)
 
-def reverse_geocode_all(*data: list[Point]) \
+def reverse_geocode_all(*data: list[Point], geocoder=None) \
     -> tuple[geopandas.GeoDataFrame]:
     """reverse geocode list of coordinates
     """
-    return tuple(map(reverse_geocode, data))
+    return tuple(reverse_geocode(coords, geocoder) for coords in data)
 
 def coords_from_df(df: pandas.DataFrame) -> list[Point]:
     """extract coordinates from csv file
     """
-    return list(map(lambda x: Point(x[1].x, x[1].y), df.iterrows()))
+    return list(geopandas.points_from_xy(*xy_from_df(df)))
+
+def points_geodata(df: pandas.DataFrame, crs='EPSG:4326') \
+        -> geopandas.GeoDataFrame:
+    """build point geodata from the x, y columns of a dataframe without
+    geocoding them
+    """
+    return geopandas.GeoDataFrame(
+            geometry=geopandas.points_from_xy(*xy_from_df(df)), crs=crs)
 
 def coords_from_geodata(geodata: geopandas.GeoDataFrame) \
         -> list[tuple[float]]:
@@ -255,9 +477,7 @@ def coords_from_geodata(geodata: geopandas.GeoDataFrame) \
 
     sample return value is [(1, 2), (3, 4)]
     """
-    assert all('point' in t.lower() for t in geodata.geometry.geom_type.unique()), \
-            "geometry must be points before extracting lat,long pairs"
-    return [(p.x, p.y) for p in geodata.geometry]
+    return list(zip(*(a.tolist() for a in xy_from_geodata(geodata))))
 
 def coords_from_multiple(*geodata: geopandas.GeoDataFrame) \
         -> tuple[list[tuple[float]]]:
@@ -269,17 +489,104 @@ def lat_long_from_coords(coords: list[tuple]):
     """given a list of coordinates [ len(tuple)==2 ] extract first
     values as lattitude and second values a longitudes values
     """
-    x, y = list(zip(*coords))[0], list(zip(*coords))[1]
-    return list(x), list(y)
+    xy = numpy.asarray(coords, dtype=float).reshape(-1, 2)
+    return xy[:, 0].tolist(), xy[:, 1].tolist()
+
+def xy_from_df(df: pandas.DataFrame, x: str='x', y: str='y') \
+        -> tuple[numpy.ndarray, numpy.ndarray]:
+    """get the x, y columns of a dataframe as float arrays"""
+    return (df[x].to_numpy(dtype=float, copy=False),
+            df[y].to_numpy(dtype=float, copy=False))
+
+def xy_from_geodata(geodata: geopandas.GeoDataFrame | geopandas.GeoSeries) \
+        -> tuple[numpy.ndarray, numpy.ndarray]:
+    """get the coordinates of point geodata as float arrays"""
+    geoms = geodata.geometry if isinstance(geodata, geopandas.GeoDataFrame) \
+            else geodata
+    assert all('point' in t.lower() for t in geoms.geom_type.unique()), \
+            "geometry must be points before extracting x, y arrays"
+    return geoms.x.to_numpy(dtype=float), geoms.y.to_numpy(dtype=float)
+
+@lru_cache(maxsize=32)
+def transformer(from_crs: CRS | str, to_crs: CRS | str) -> Transformer:
+    """get a (cached) transformer between two crs, coordinates are in
+    x, y (long, lat) order
+    """
+    return Transformer.from_crs(from_crs, to_crs, always_xy=True)
+
+def transform_xy(x: numpy.ndarray, y: numpy.ndarray, from_crs: CRS | str,
+        to_crs: CRS | str) -> tuple[numpy.ndarray, numpy.ndarray]:
+    """transform coordinate arrays from one crs to another"""
+    if CRS.from_user_input(from_crs) == CRS.from_user_input(to_crs):
+        return numpy.asarray(x, dtype=float), numpy.asarray(y, dtype=float)
+    tx, ty = transformer(from_crs, to_crs).transform(
+            numpy.asarray(x, dtype=float), numpy.asarray(y, dtype=float))
+    return numpy.asarray(tx), numpy.asarray(ty)
 
 
-def nearest_node_ids(G: nx.MultiDiGraph, longitude: list[float],
+def nearest_node_ids(G: nx.MultiDiGraph | CSRGraph, longitude: list[float],
         lattitude: list[float]) -> list[str]:
     """get the id's of nearest nodes around some coordinates in a
     graph
     """
+    if isinstance(G, CSRGraph):
+        return G.nearest_nodes(longitude, lattitude).tolist()
     return ox.nearest_nodes(G, longitude, lattitude)
 
+def flatten(seqs: list[list[Any]]) -> tuple[numpy.ndarray, numpy.ndarray]:
+    """flatten a list of sequences into one array and the offsets of each
+    sequence, sequence i is flat[offsets[i]:offsets[i+1]]
+    """
+    lengths = numpy.fromiter(map(len, seqs), dtype=numpy.int64, count=len(seqs))
+    offsets = numpy.zeros(len(seqs) + 1, dtype=numpy.int64)
+    numpy.cumsum(lengths, out=offsets[1:])
+    flat = numpy.array(list(chain.from_iterable(seqs)))
+    return flat, offsets
+
+def lines_from_xy(x: numpy.ndarray, y: numpy.ndarray,
+        offsets: numpy.ndarray) -> numpy.ndarray:
+    """build linestrings from flat coordinate arrays, line i is made of
+    coordinates offsets[i]:offsets[i+1]. Lines of one point are repeated
+    to make a line of zero length.
+    """
+    lengths = numpy.diff(offsets)
+    # repeat the coordinates of single point lines
+    reps = numpy.ones(len(x), dtype=numpy.int64)
+    reps[offsets[:-1][lengths == 1]] = 2
+    x, y = numpy.repeat(x, reps), numpy.repeat(y, reps)
+    lengths = numpy.maximum(lengths, 2)
+    index = numpy.repeat(numpy.arange(len(lengths)), lengths)
+
+    if hasattr(shapely, 'linestrings'):
+        return shapely.linestrings(x, y, indices=index)
+    coords = numpy.column_stack([x, y])
+    bounds = numpy.concatenate([[0], numpy.cumsum(lengths)])
+    return numpy.array([LineString(coords[a:b])
+            for a, b in zip(bounds[:-1], bounds[1:])], dtype=object)
+
+def path_lengths(x: numpy.ndarray, y: numpy.ndarray,
+        offsets: numpy.ndarray) -> numpy.ndarray:
+    """planar length of the lines in flat coordinate arrays, see
+    `lines_from_xy`
+    """
+    seg = numpy.hypot(numpy.diff(x), numpy.diff(y))
+    total = numpy.concatenate([[0.0], numpy.cumsum(seg)])
+    ends = numpy.maximum(offsets[1:] - 1, offsets[:-1])
+    return total[ends] - total[offsets[:-1]]
+
+def convex_hull(x: numpy.ndarray, y: numpy.ndarray) -> Polygon:
+    """convex hull of coordinate arrays
+
+    only the hull vertices are turned into a shapely geometry, less than
+    three points or points on a line give a point or line
+    """
+    xy = numpy.column_stack([x, y])
+    try:
+        return Polygon(xy[ConvexHull(xy).vertices])
+    except (RuntimeError, ValueError):
+        # QhullError (a RuntimeError) for flat inputs
+        return MultiPoint(numpy.unique(xy, axis=0)).convex_hull
+
 def select_from(data: geopandas.GeoDataFrame, ids: list[str]):
     """return a geopandas or geoseries selected from nodes based on
     node ids
@@ -305,14 +612,63 @@ def to_crs(crs: CRS | str, data: geopandas.GeoDataFrame) \
     return data.to_crs(crs) if data.crs != crs \
         else data
 
+# osmnx attributes that hold a list of values on edges merged while
+# simplifying the graph, they are stored as categorical strings
+CATEGORICAL_ATTRS = ('name', 'highway', 'ref', 'lanes', 'maxspeed', 'width',
+        'est_width', 'access', 'bridge', 'tunnel', 'junction', 'service',
+        'area', 'landuse')
+
+# id attributes that can hold a list, lists are stored as tuples
+ID_ATTRS = ('osmid', 'osmid_original')
+
+# label attributes whose lists are joined like "Maxwell Street / Kejetia
+# road", the way `geocode` labels streets
+JOINED_ATTRS = ('name',)
+
 def unhashable_cols(data: geopandas.GeoDataFrame) -> list[str]:
     """return the names of all columns with unhashable types
     
     this is to stop the error: unhashable type: 'list'
     geometry columns are excluded
     """
-    cols_stat = list((data.applymap(type) == list).any().items())
-    return [c for c, h in cols_stat if h and c != 'geometry']
+    return [c for c in data.columns if c != 'geometry'
+            and data[c].dtype == object
+            and any(isinstance(v, list) for v in data[c].to_numpy())]
+
+def normalize_schema(data: geopandas.GeoDataFrame) -> geopandas.GeoDataFrame:
+    """encode the list valued columns of osmnx node/edge geodata once so
+    every column is hashable
+
+    lists in `ID_ATTRS` columns become tuples, lists in `JOINED_ATTRS`
+    columns are joined with ' / '. `CATEGORICAL_ATTRS` and other columns
+    holding lists become categorical strings (lists are written like
+    "['primary', 'secondary']"). Only object and string typed columns
+    are looked at.
+
+    Args:
+        data (geopandas.GeoDataFrame): nodes or edges from `graph_to_gdfs`
+
+    Returns:
+        geopandas.GeoDataFrame: data, changed in place
+    """
+    for col in data.columns:
+        if col == 'geometry' or not (data[col].dtype == object
+                or pandas.api.types.is_string_dtype(data[col].dtype)):
+            continue
+        values = data[col].to_numpy()
+        has_list = any(isinstance(v, list) for v in values)
+        if col in ID_ATTRS:
+            if has_list:
+                data[col] = pandas.Series(
+                        [tuple(v) if isinstance(v, list) else v for v in values],
+                        index=data.index, dtype=object)
+        elif has_list or col in CATEGORICAL_ATTRS:
+            if has_list and col in JOINED_ATTRS:
+                data[col] = pandas.Series([' / '.join(map(str, v))
+                        if isinstance(v, list) else v for v in values],
+                        index=data.index, dtype=object)
+            data[col] = data[col].astype('string').astype('category')
+    return data
 
 class PlotArgs(dict):    
     """collects all the args required to do a static/interactive plot
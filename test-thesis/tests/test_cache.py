@@ -0,0 +1,40 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from autogis.cache import ResultCache
+from autogis.utils import sampled_cache
+
+
+def put_many(job):
+    directory, worker = job
+    store = ResultCache(directory, max_bytes=2048)
+    for i in range(50):
+        store.put(f"g{worker}", 'algo', dict(i=i), b'x' * 200)
+        store.get(f"g{(worker + 1) % 4}", 'algo', dict(i=i))
+    return True
+
+
+def test_shared_store_between_processes(tmp_path):
+    with ProcessPoolExecutor(max_workers=4) as pool:
+        assert all(pool.map(put_many, [(str(tmp_path), w) for w in range(4)]))
+    assert ResultCache(str(tmp_path)).size() <= 4096
+
+
+def test_evict_skips_removed_files(tmp_path, monkeypatch):
+    store = ResultCache(str(tmp_path))
+    store.put('g', 'algo', {}, 1)
+    store.put('g', 'algo', dict(k=1), 2)
+    listed = store._stats()
+    # removed by another process after the store was listed
+    os.remove(listed[0][0])
+    monkeypatch.setattr(store, '_stats', lambda: listed)
+    store.max_bytes = 0
+    store.evict()
+    assert not os.listdir(tmp_path)
+
+
+def test_unseeded_samples_are_not_cached():
+    store = ResultCache()
+    assert sampled_cache(10, None, store) is False
+    assert sampled_cache(10, 1, store) is store
+    assert sampled_cache(None, None, store) is store
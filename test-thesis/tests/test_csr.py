@@ -0,0 +1,28 @@
+import networkx as nx
+import pytest
+
+from autogis import CSRGraph, Graph
+from autogis.store import load_graph
+
+
+def test_graph_routes_on_csr():
+    G = load_graph('data/Adum.graphml')
+    g = Graph('custom', lambda: G).download()
+    nodes = list(G)
+    origins, dests = nodes[:20], nodes[-20:]
+    paths = g.shortest_paths(origins, dests, skip_missing=True)
+    for o, d, path in zip(origins, dests, paths):
+        if path is None:
+            assert not nx.has_path(G, o, d)
+            continue
+        assert nx.path_weight(G, path, 'length') == pytest.approx(
+                nx.shortest_path_length(G, o, d, weight='length'))
+    assert g.shortest_path(origins[0], origins[0]) == [origins[0]]
+
+
+def test_dijkstra_rejects_unknown_weights():
+    C = CSRGraph.from_graph(load_graph('data/Adum.graphml'))
+    source = int(C.ids[0])
+    assert C.dijkstra(source, weight=None)[0][source] == 0
+    with pytest.raises(ValueError, match='travel_time'):
+        C.dijkstra(source, weight='travel_time')
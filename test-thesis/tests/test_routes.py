@@ -0,0 +1,68 @@
+import networkx as nx
+import pandas
+import pytest
+from shapely.geometry import LineString
+
+from autogis import Graph, Route
+
+
+def two_component_graph() -> nx.MultiDiGraph:
+    """two separate streets around Adum, (lon, lat) nodes"""
+    G = nx.MultiDiGraph(crs='EPSG:4326')
+    for node, (x, y) in enumerate([(-1.625, 6.690), (-1.624, 6.690),
+            (-1.615, 6.700), (-1.614, 6.700)]):
+        G.add_node(node, x=x, y=y)
+    for u, v in [(0, 1), (2, 3)]:
+        G.add_edge(u, v, key=0, osmid=10 + u, length=110.0)
+        G.add_edge(v, u, key=0, osmid=10 + u, length=110.0)
+    # a curved street
+    G.edges[0, 1, 0]['geometry'] = LineString(
+            [(-1.625, 6.690), (-1.6245, 6.6905), (-1.624, 6.690)])
+    return G
+
+
+def write_points(path, points):
+    pandas.DataFrame(points, columns=['x', 'y']).to_csv(path, index=False)
+
+
+def test_iter_routes_unreachable_chunk(tmp_path):
+    G = Graph('custom', two_component_graph).download()
+    origin, dest = tmp_path / 'origin.csv', tmp_path / 'dest.csv'
+    # first pair is routable, second pair crosses components
+    write_points(origin, [(-1.625, 6.690), (-1.625, 6.690)])
+    write_points(dest, [(-1.624, 6.690), (-1.614, 6.700)])
+
+    chunks = list(G.iter_routes(str(origin), str(dest), chunksize=1))
+    assert [len(c) for c in chunks] == [1, 0]
+    assert list(chunks[1].columns) == list(chunks[0].columns)
+    assert chunks[0].osmids[0].tolist() == [0, 1]
+
+
+def test_routes_to_geodata_empty():
+    G = Graph('custom', two_component_graph).download()
+    routes = G.routes_to_geodata([])
+    assert len(routes) == 0
+    assert set(routes.columns) == {'geometry', 'route_dist', 'osmids'}
+
+
+def test_lazy_projection_is_not_handed_out():
+    G = Graph('custom', two_component_graph).download()
+    route = Route('coords_list', [(6.690, -1.625)], [(6.690, -1.624)],
+            geocoder=False)
+    G.distance_matrix(route)
+    # routing only projected the nodes
+    assert 'geometry_crs' in G.G.graph
+
+    graph = G.graph()
+    assert 'geometry_crs' not in graph.graph
+    x0, y0 = graph.edges[0, 1, 0]['geometry'].coords[0]
+    assert (x0, y0) == (graph.nodes[0]['x'], graph.nodes[0]['y'])
+
+
+def test_stream_rejects_files_of_different_lengths(tmp_path):
+    origin, dest = tmp_path / 'origin.csv', tmp_path / 'dest.csv'
+    write_points(origin, [(-1.625, 6.690)] * 3)
+    write_points(dest, [(-1.624, 6.690)] * 2)
+    for chunksize in (1, 2, 10):
+        with pytest.raises(ValueError, match='origin.csv and .*dest.csv'):
+            list(Route.stream(str(origin), str(dest), chunksize))
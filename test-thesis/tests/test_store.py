@@ -0,0 +1,43 @@
+import os
+import shutil
+from concurrent.futures import ProcessPoolExecutor
+
+import networkx as nx
+
+from autogis.store import clear_graph_cache, load_graph, read_graph, \
+        save_graph
+
+
+def test_load_graph_changes_do_not_leak(tmp_path):
+    path = str(tmp_path / 'Adum.graphml')
+    shutil.copy('data/Adum.graphml', path)
+    G = load_graph(path)
+    nx.set_node_attributes(G, 1.0, 'bc')
+    assert 'bc' not in next(iter(load_graph(path).nodes(data=True)))[1]
+    # read only callers can share the graph kept in memory
+    assert load_graph(path, copy=False) is load_graph(path, copy=False)
+
+
+def load_count(path):
+    G = load_graph(path, copy=False)
+    return len(G), G.number_of_edges()
+
+
+def test_concurrent_first_loads(tmp_path):
+    path = str(tmp_path / 'Adum.graphml')
+    shutil.copy('data/Adum.graphml', path)
+    with ProcessPoolExecutor(max_workers=8) as pool:
+        counts = set(pool.map(load_count, [path] * 16))
+    assert len(counts) == 1
+    assert sorted(os.listdir(tmp_path)) == ['Adum.graph', 'Adum.graphml']
+    clear_graph_cache()
+    assert load_count(path) == counts.pop()
+
+
+def test_save_graph_replaces_store(tmp_path):
+    G = load_graph('data/Adum.graphml')
+    store = str(tmp_path / 'Adum.graph')
+    save_graph(G.subgraph(list(G)[:10]).copy(), store)
+    save_graph(G, store)
+    assert len(read_graph(store)) == len(G)
+    assert os.listdir(tmp_path) == ['Adum.graph']
@@ -0,0 +1,18 @@
+import geopandas
+from shapely.geometry import Point
+
+from autogis.utils import normalize_schema
+
+
+def test_normalize_schema_joins_names():
+    data = geopandas.GeoDataFrame({
+        'osmid': [[1, 2], 3],
+        'name': [['Ministries road', 'Maxwell Street'], 'Kejetia road'],
+        'highway': [['primary', 'secondary'], 'primary'],
+    }, geometry=[Point(0, 0), Point(1, 1)])
+    normalize_schema(data)
+    assert data.osmid.tolist() == [(1, 2), 3]
+    assert data.name.tolist() == ['Ministries road / Maxwell Street',
+            'Kejetia road']
+    assert str(data.name.dtype) == 'category'
+    assert data.highway[0] == "['primary', 'secondary']"